@@ -1,5 +1,4 @@
 from django.apps import AppConfig
-from .utils.scheduler import start_reminder_scheduler
 
 
 class ApiConfig(AppConfig):
@@ -7,5 +6,7 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        # Start the reminder scheduler
-        start_reminder_scheduler()
+        # Register signal handlers (cache invalidation, reminder scheduling). Periodic work is not 
+        # started here but by `manage.py run_scheduler`, so web workers, migrate and shells stay free 
+        # of background threads. 
+        from . import signals
@@ -1,3 +1,4 @@
+import pytz
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import User
@@ -7,10 +8,19 @@ from .models import User
 # thing is that it doesnt allow 'password' to be a password because its too simple. 
 class RegisterUserForm(UserCreationForm):
     phone = forms.CharField(max_length=15, required=False) 
+    time_zone = forms.CharField(max_length=64, required=False) # the device's IANA zone, for reminder times 
 
     class Meta:
         model = User
-        fields = ['first_name', 'last_name', 'email', 'phone', 'password1', 'password2', "role"]
+        fields = ['first_name', 'last_name', 'email', 'phone', 'password1', 'password2', "role", 'time_zone']
+
+    def clean_time_zone(self): 
+        time_zone = self.cleaned_data.get('time_zone') 
+        if not time_zone: 
+            return User._meta.get_field('time_zone').default 
+        if time_zone not in pytz.all_timezones_set: 
+            raise forms.ValidationError("Invalid timezone, expected an IANA name such as America/Chicago.") 
+        return time_zone 
 
 
 class RegisterProviderForm (forms.ModelForm): 
@@ -0,0 +1,74 @@
+from collections import Counter
+from decimal import Decimal
+from itertools import groupby
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from api.models import User, WeightRecord
+from api.utils.alert_rules import AlertRuleEngine, ALERT_RULES, DEFAULT_ALARM_THRESHOLD_LBS
+from api.utils.export_utils import iter_in_chunks
+
+class Command(BaseCommand):
+    help = ('Replay the stored weight history through the alert rules and report how often each rule '
+            'would have fired, for each of the given thresholds, to help tune them. Nothing is written or sent.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=Decimal, nargs='+',
+                            help='Alarm thresholds (lbs) to try for every patient, instead of their own. All are evaluated in the same pass')
+        parser.add_argument('--percent', type=Decimal, help='Threshold for the percent_of_baseline rule')
+        parser.add_argument('--rules', help=f'Comma separated rules to evaluate (default: the configured ones, out of {", ".join(ALERT_RULES)})')
+        parser.add_argument('--patient', type=int, help='Only replay this patient')
+
+    def handle(self, *args, **options):
+        engine_options = {}
+        if options['rules']:
+            engine_options['rule_names'] = [name.strip() for name in options['rules'].split(',')]
+            unknown = set(engine_options['rule_names']) - set(ALERT_RULES)
+            if unknown:
+                raise CommandError(f'Unknown rules: {", ".join(sorted(unknown))}')
+        if options['percent'] is not None:
+            engine_options['percent_threshold'] = options['percent']
+
+        patients = User.objects.filter(role=User.PATIENT)
+        if options['patient']:
+            patients = patients.filter(id=options['patient'])
+        patients = {
+            patient['id']: patient
+            for patient in patients.values('id', 'unit_preference', alarm_threshold=F('patient_info__alarm_threshold'))
+        }
+        thresholds = options['threshold'] or [None] # None: each patient's own
+
+        rule_counts = {threshold: Counter() for threshold in thresholds}
+        alerts = Counter()
+        records = patient_count = 0
+
+        # One pass over the whole history, a patient at a time, evaluating every threshold on each record
+        history = iter_in_chunks(WeightRecord.objects.filter(patient_id__in=patients), ['patient_id', 'id', 'weight', 'timestamp'])
+        for patient_id, rows in groupby(history, key=lambda row: row['patient_id']):
+            patient = patients[patient_id]
+            unit = 'kg' if patient['unit_preference'] == User.METRIC else 'lbs'
+            engines = {
+                threshold: AlertRuleEngine(
+                    threshold if threshold is not None else patient['alarm_threshold'] or DEFAULT_ALARM_THRESHOLD_LBS,
+                    unit=unit,
+                    **engine_options
+                )
+                for threshold in thresholds
+            }
+            states = {threshold: {} for threshold in thresholds}
+
+            # Same incremental evaluation as record_weight, in chronological order
+            for row in sorted(rows, key=lambda row: (row['timestamp'], row['id'])):
+                for threshold, engine in engines.items():
+                    reasons, states[threshold] = engine.evaluate(states[threshold], row['weight'], row['timestamp'])
+                    if reasons:
+                        alerts[threshold] += 1
+                        rule_counts[threshold].update(reasons.keys())
+                records += 1
+            patient_count += 1
+
+        self.stdout.write(f'Replayed {records} records for {patient_count} patients')
+        for threshold in thresholds:
+            label = f'threshold {threshold} lbs' if threshold is not None else "patients' own thresholds"
+            self.stdout.write(f'{label}: {alerts[threshold]} alerts')
+            for rule_name, count in rule_counts[threshold].most_common():
+                self.stdout.write(f'  {rule_name}: {count}')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.utils.cache_utils import get_cache_stats
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the provider dashboard cache (304 Not Modified revalidations are not counted)'
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats('dashboard')
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else 'n/a'
+        self.stdout.write(f"dashboard: {stats['hits']} hits, {stats['misses']} misses, hit rate {hit_rate}")
@@ -0,0 +1,68 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api.models import User, PatientNote
+from api.utils.notification_utils import notification_page_query
+from api.utils.weight_history import encode_cursor, weight_history_page_query
+from api.utils.weight_summary import average_window_records, dashboard_patients
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN on the hot per-patient/per-provider queries and fail if any of them falls back to '
+            'a filesort or a full table scan. Run it against a database with realistic data in it, since '
+            'MySQL is happy to table-scan tables that only have a handful of rows.')
+
+    def hot_queries(self):
+        """
+        The queries are built by the same functions the views call, so this checks what actually runs.
+        """
+        patient_id = User.objects.filter(role=User.PATIENT).values_list('id', flat=True).first() or 0
+        provider_id = User.objects.filter(role=User.PROVIDER).values_list('id', flat=True).first() or 0
+        now = timezone.now()
+        weight_page, _ = weight_history_page_query(patient_id, {})
+        weight_next_page, _ = weight_history_page_query(patient_id, {'cursor': encode_cursor(now, 0)})
+        notification_page, _ = notification_page_query(provider_id, {})
+        notification_next_page, _ = notification_page_query(provider_id, {'cursor': encode_cursor(now, 0)})
+        return {
+            'get_weight_record (first page)': weight_page,
+            'get_weight_record (next page)': weight_next_page,
+            'dashboard': dashboard_patients(provider_id),
+            'weight summary (7-day window)': average_window_records(patient_id, now),
+            'get_patient_data (notes)': PatientNote.objects.filter(patient_id=patient_id).order_by('-timestamp'),
+            'get_patient_notes': PatientNote.objects.filter(patient_id=patient_id).order_by('timestamp'),
+            'get_provider_notifications (first page)': notification_page,
+            'get_provider_notifications (next page)': notification_next_page,
+        }
+
+    def find_problems(self, plan):
+        """
+        Walk a MySQL JSON plan and collect every table access that uses a filesort or a full scan.
+        """
+        problems = []
+        if isinstance(plan, dict):
+            if plan.get('using_filesort'):
+                problems.append('filesort')
+            if plan.get('access_type') == 'ALL':
+                problems.append(f"full scan of {plan.get('table_name', '?')}")
+            for value in plan.values():
+                problems.extend(self.find_problems(value))
+        elif isinstance(plan, list):
+            for value in plan:
+                problems.extend(self.find_problems(value))
+        return problems
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'mysql':
+            raise CommandError(f'Query plan checks only support MySQL, not {connection.vendor}')
+
+        failures = 0
+        for name, queryset in self.hot_queries().items():
+            problems = self.find_problems(json.loads(queryset.explain(format='json')))
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'{name}: {", ".join(problems)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+
+        if failures:
+            raise CommandError(f'{failures} hot queries have a degraded plan')
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.utils.alert_utils import deliver_pending_alerts
+
+class Command(BaseCommand):
+    help = 'Deliver queued weight change alerts (email/SMS) from the outbox, retrying failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting after one pass')
+        parser.add_argument('--interval', type=int, default=10, help='Seconds between polls when looping')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections() # drop a connection the database has closed meanwhile 
+            try:
+                sent, failed = deliver_pending_alerts()
+                if sent or failed:
+                    self.stdout.write(f'Delivered {sent} alerts, {failed} failed')
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error delivering alerts: {str(e)}'))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
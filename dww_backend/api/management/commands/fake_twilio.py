@@ -0,0 +1,61 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = ('Run a local stand-in for the Twilio Messages API, for trying out and load testing SMS '
+            'without sending real texts. Point TWILIO_API_URL at it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8030, help='Port to listen on (default: 8030)')
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds to wait before answering each request, like the real API (default: 0.2)')
+
+    def handle(self, *args, **options):
+        latency = options['latency']
+        stats = {'received': 0, 'started': None}
+        lock = threading.Lock()
+        stdout = self.stdout
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                # Only message creation is supported: /2010-04-01/Accounts/<sid>/Messages.json
+                if not self.path.endswith('/Messages.json'):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                time.sleep(latency)
+
+                with lock:
+                    stats['received'] += 1
+                    stats['started'] = stats['started'] or time.monotonic()
+                    elapsed = time.monotonic() - stats['started']
+                    rate = stats['received'] / elapsed if elapsed else 0
+                    stdout.write(f"SMS #{stats['received']} to {form.get('To')} ({rate:.1f}/s): {form.get('Body', '')[:60]}")
+
+                body = json.dumps({
+                    'sid': 'SM' + uuid.uuid4().hex,
+                    'to': form.get('To'),
+                    'from': form.get('From'),
+                    'body': form.get('Body'),
+                    'status': 'queued',
+                }).encode()
+                self.send_response(201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), Handler)
+        self.stdout.write(f"Fake Twilio API listening on http://127.0.0.1:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
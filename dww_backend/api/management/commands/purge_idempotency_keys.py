@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from api.utils.idempotency import purge_expired_idempotency_keys
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses that are past their TTL'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
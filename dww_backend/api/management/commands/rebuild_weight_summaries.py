@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api.models import User
+from api.utils.weight_summary import rebuild_weight_summary
+
+class Command(BaseCommand):
+    help = 'Rebuild every patient\'s weight summary from their raw weight records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, help='Only rebuild the summary for this patient id')
+
+    def handle(self, *args, **options):
+        patients = User.objects.filter(role=User.PATIENT)
+        if options['patient']:
+            patients = patients.filter(id=options['patient'])
+
+        count = 0
+        for patient in patients.iterator(chunk_size=500):
+            rebuild_weight_summary(patient)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} weight summaries'))
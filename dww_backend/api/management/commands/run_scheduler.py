@@ -0,0 +1,16 @@
+import signal
+from django.core.management.base import BaseCommand
+from api.utils.scheduler import build_scheduler
+
+class Command(BaseCommand):
+    help = 'Run the periodic jobs (reminder emails, queued alerts, idempotency key cleanup) until stopped'
+
+    def handle(self, *args, **options):
+        scheduler = build_scheduler()
+        signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+        self.stdout.write('Scheduler started')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Scheduler stopped')
@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = 'Show how late the scheduler\'s jobs and the last reminders ran'
+
+    def handle(self, *args, **options):
+        stats = cache.get('scheduler:stats')
+        if not stats:
+            self.stdout.write('No scheduler has published stats yet')
+            return
+        self.stdout.write(f"As of {stats['updated']}:")
+        for name, job in stats['jobs'].items():
+            self.stdout.write(
+                f"  {name}: {job['runs']} runs, {job['errors']} errors, lag {job['last_lag']:.2f}s "
+                f"(max {job['max_lag']:.2f}s), last run took {job['last_duration']:.2f}s"
+            )
+
+        reminders = cache.get('scheduler:reminders')
+        if reminders:
+            self.stdout.write(
+                f"Last reminders ({reminders['at']}): {reminders['due']} due, {reminders['sent']} sent, {reminders.get('failed', 0)} failed, "
+                f"{reminders['skipped']} skipped, lag avg {reminders['avg_lag']:.2f}s, max {reminders['max_lag']:.2f}s"
+            )
+            if 'duration' in reminders:
+                self.stdout.write(
+                    f"  send latency p50 {reminders['p50_latency']:.2f}s, p99 {reminders['p99_latency']:.2f}s, "
+                    f"tick took {reminders['duration']:.2f}s, overran by {reminders['overrun']:.2f}s"
+                )
@@ -0,0 +1,14 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_patientinfo_alarm_threshold_alter_user_shareable_id'),
+        ('api', '0013_notificationpreference_text_notifications'),
+    ]
+
+    operations = [
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:27
+
+from datetime import timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg
+
+
+def populate_weight_summaries(apps, schema_editor):
+    # Mirrors api.utils.weight_summary.rebuild_weight_summary using the historical models 
+    User = apps.get_model('api', 'User')
+    WeightRecord = apps.get_model('api', 'WeightRecord')
+    WeightSummary = apps.get_model('api', 'WeightSummary')
+
+    for patient_id in User.objects.filter(role='patient').values_list('id', flat=True).iterator():
+        records = WeightRecord.objects.filter(patient_id=patient_id).order_by('-timestamp')
+        latest = records.values('weight', 'timestamp').first()
+        if latest is None:
+            WeightSummary.objects.create(patient_id=patient_id)
+            continue
+        day_start = latest['timestamp'].replace(hour=0, minute=0, second=0, microsecond=0)
+        prev = records.filter(timestamp__lt=day_start).values('weight', 'timestamp').first()
+        average = records.filter(
+            timestamp__gt=latest['timestamp'] - timedelta(days=7)
+        ).aggregate(average=Avg('weight'))['average']
+        WeightSummary.objects.create(
+            patient_id=patient_id,
+            latest_weight=latest['weight'],
+            latest_timestamp=latest['timestamp'],
+            prev_weight=prev['weight'] if prev else None,
+            prev_timestamp=prev['timestamp'] if prev else None,
+            avg_weight_7d=round(Decimal(average), 2) if average is not None else None,
+            record_count=records.count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_merge_20261018_1627'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unit_preference',
+            field=models.CharField(choices=[('imperial', 'Imperial (lbs)'), ('metric', 'Metric (kg)')], default='imperial', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='WeightSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latest_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('latest_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('prev_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('prev_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('avg_weight_7d', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('patient', models.OneToOneField(limit_choices_to={'role': 'patient'}, on_delete=django.db.models.deletion.CASCADE, related_name='weight_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(populate_weight_summaries, migrations.RunPython.noop),
+    ]
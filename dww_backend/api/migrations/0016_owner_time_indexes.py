@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_weightsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientnote',
+            index=models.Index(fields=['patient', '-timestamp'], name='patientnote_patient_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='providernotification',
+            index=models.Index(fields=['provider', '-created_at'], name='notification_provider_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightrecord',
+            index=models.Index(fields=['patient', '-timestamp'], name='weightrecord_patient_time_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_alertoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weightrecord',
+            name='client_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='weightrecord',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='weightrecord',
+            constraint=models.UniqueConstraint(fields=('patient', 'client_id'), name='weightrecord_unique_client_id'),
+        ),
+    ]
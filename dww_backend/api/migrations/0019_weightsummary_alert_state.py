@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_weightrecord_client_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weightsummary',
+            name='alert_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_providernotification_patient'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='providernotification',
+            index=models.Index(fields=['provider', 'is_read'], name='notification_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:44
+
+from datetime import datetime, timedelta
+
+import pytz
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_reminders(apps, schema_editor):
+    # Mirrors api.utils.reminder_schedule.next_fire_time as of this migration 
+    PatientReminder = apps.get_model('api', 'PatientReminder')
+    eastern = pytz.timezone('America/New_York')
+    now = timezone.now()
+    today = now.astimezone(eastern).date()
+
+    reminders = list(PatientReminder.objects.all())
+    for reminder in reminders:
+        fire_time = reminder.time.replace(second=0, microsecond=0)
+        for offset in range(2):
+            candidate = eastern.localize(datetime.combine(today + timedelta(days=offset), fire_time))
+            if candidate > now:
+                reminder.next_fire_at = candidate.astimezone(pytz.utc)
+                break
+    PatientReminder.objects.bulk_update(reminders, ['next_fire_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientreminder',
+            name='next_fire_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(schedule_reminders, migrations.RunPython.noop),
+    ]
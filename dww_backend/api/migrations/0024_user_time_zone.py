@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_patientreminder_next_fire_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='time_zone',
+            field=models.CharField(default='America/New_York', max_length=64),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:47
+
+from datetime import datetime, timedelta
+
+import pytz
+from django.db import migrations, models
+from django.utils import timezone
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def days_to_mask(apps, schema_editor):
+    # "Monday, Wednesday" -> 0b0000101. The reminders used to fire every day whatever their days were, 
+    # so their next fire times are recomputed as well (mirrors api.utils.reminder_schedule.next_fire_time) 
+    PatientReminder = apps.get_model('api', 'PatientReminder')
+    now = timezone.now()
+
+    reminders = list(PatientReminder.objects.select_related('patient'))
+    for reminder in reminders:
+        names = {name.strip() for name in reminder.days.split(',')}
+        reminder.days_mask = sum(1 << i for i, day in enumerate(WEEKDAYS) if day in names)
+
+        zone = pytz.timezone(reminder.patient.time_zone)
+        fire_time = reminder.time.replace(second=0, microsecond=0)
+        today = now.astimezone(zone).date()
+        reminder.next_fire_at = None
+        for offset in range(8):
+            day = today + timedelta(days=offset)
+            if not reminder.days_mask & (1 << day.weekday()):
+                continue
+            candidate = zone.localize(datetime.combine(day, fire_time), is_dst=False)
+            if candidate > now:
+                reminder.next_fire_at = candidate.astimezone(pytz.utc)
+                break
+    PatientReminder.objects.bulk_update(reminders, ['days_mask', 'next_fire_at'], batch_size=500)
+
+
+def mask_to_days(apps, schema_editor):
+    PatientReminder = apps.get_model('api', 'PatientReminder')
+    reminders = list(PatientReminder.objects.all())
+    for reminder in reminders:
+        reminder.days = ", ".join(day for i, day in enumerate(WEEKDAYS) if reminder.days_mask & (1 << i))
+    PatientReminder.objects.bulk_update(reminders, ['days'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_user_time_zone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientreminder',
+            name='days_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(days_to_mask, mask_to_days),
+        # blank, so that the column can be added back with '' when unapplying 
+        migrations.AlterField(
+            model_name='patientreminder',
+            name='days',
+            field=models.CharField(blank=True, max_length=62),
+        ),
+        migrations.RemoveField(
+            model_name='patientreminder',
+            name='days',
+        ),
+        migrations.RenameField(
+            model_name='patientreminder',
+            old_name='days_mask',
+            new_name='days',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_reminderdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertoutbox',
+            name='sent_to',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
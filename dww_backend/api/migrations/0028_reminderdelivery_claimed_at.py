@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_alertoutbox_sent_to'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderdelivery',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='reminderdelivery',
+            index=models.Index(fields=['status', 'claimed_at'], name='reminderdelivery_lease_idx'),
+        ),
+    ]
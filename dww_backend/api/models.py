@@ -1,4 +1,6 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import BaseUserManager
 from phonenumber_field.modelfields import PhoneNumberField
@@ -47,6 +49,7 @@ class User(AbstractUser):
     shareable_id = models.CharField(max_length=9, blank=True, null=True, default=None, unique=True) 
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=PATIENT)
     unit_preference = models.CharField(max_length=10, choices=UNIT_CHOICES, default=IMPERIAL)
+    time_zone = models.CharField(max_length=64, default='America/New_York')  # IANA name, reminder times are in this zone 
     verification_token = models.CharField(max_length=100, blank=True, null=True)
     is_verified = models.BooleanField(default=False)
 
@@ -115,8 +118,17 @@ class WeightRecord(models.Model):
         on_delete=models.CASCADE, 
         related_name='weight_records'
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # when the weight was measured; set by the client for offline uploads 
     weight = models.DecimalField(max_digits=5, decimal_places=2)
+    client_id = models.CharField(max_length=64, null=True, blank=True)  # client-generated id, makes batch uploads safe to replay 
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-timestamp'], name='weightrecord_patient_time_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'client_id'], name='weightrecord_unique_client_id'),
+        ]
 
 class PatientNote(models.Model):
     patient = models.ForeignKey(
@@ -128,7 +140,14 @@ class PatientNote(models.Model):
     timestamp = models.DateTimeField(blank=True, null=True)
     note = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-timestamp'], name='patientnote_patient_time_idx'),
+        ]
+
 class PatientReminder(models.Model):
+    WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
     patient = models.ForeignKey(
         User, 
         limit_choices_to={'role': User.PATIENT}, 
@@ -136,8 +155,59 @@ class PatientReminder(models.Model):
         related_name='patient_reminders'
     )
     time = models.TimeField()
-    days = models.CharField(max_length=62)
+    days = models.PositiveSmallIntegerField(default=0)  # bitmask, bit i set = fires on WEEKDAYS[i] (i.e. date.weekday() == i) 
     timestamp = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+    next_fire_at = models.DateTimeField(null=True, blank=True, db_index=True)  # UTC, see api/utils/reminder_schedule.py 
+
+    @classmethod
+    def days_to_mask(cls, day_names):
+        return sum(1 << cls.WEEKDAYS.index(day.strip()) for day in set(day_names))
+
+    @classmethod
+    def mask_to_days(cls, mask):
+        """
+        The ", "-joined day names the API has always returned, e.g. "Monday, Wednesday". 
+        """
+        return ", ".join(day for i, day in enumerate(cls.WEEKDAYS) if mask & (1 << i))
+
+    def fires_on(self, day):
+        return bool(self.days & (1 << day.weekday()))
+
+
+class ReminderDelivery(models.Model):
+    """
+    Ledger of reminder emails, one row per reminder occurrence. The row is written in the same 
+    transaction that claims the reminder and moves it on to its next fire time, and the unique 
+    (reminder, fire_at) constraint means no occurrence is claimed twice, however many nodes run 
+    the reminder checker. A row left pending by a node that died is claimed again once its lease 
+    has run out. See api/utils/email_utils.py. 
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    reminder = models.ForeignKey(
+        PatientReminder,
+        on_delete=models.CASCADE,
+        related_name='deliveries'
+    )
+    fire_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(default=timezone.now) # a pending row not sent within a lease of this is claimed again 
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reminder', 'fire_at'], name='reminderdelivery_unique_fire'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'claimed_at'], name='reminderdelivery_lease_idx'),
+        ]
 
 class DeactivatedUsers(models.Model):
     original_id = models.IntegerField(unique=True)
@@ -154,10 +224,23 @@ class ProviderNotification(models.Model):
         limit_choices_to={'role': User.PROVIDER},
         related_name='notifications'
     )
+    patient = models.ForeignKey(  # the patient a weight change alert is about, if any 
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='provider_notifications'
+    )
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', '-created_at'], name='notification_provider_time_idx'),
+            models.Index(fields=['provider', 'is_read'], name='notification_unread_idx'),
+        ]
+
 class NotificationPreference(models.Model):
     patient = models.OneToOneField(
         User,
@@ -168,3 +251,82 @@ class NotificationPreference(models.Model):
     email_notifications = models.BooleanField(default=False)
     text_notifications = models.BooleanField(default=False)
 
+
+class WeightSummary(models.Model):
+    """
+    Denormalized per-patient view of WeightRecord, kept up to date by record_weight so that the 
+    dashboard doesn't have to scan each patient's full weight history. Can be rebuilt from scratch 
+    with `python manage.py rebuild_weight_summaries`. 
+    """
+    patient = models.OneToOneField(
+        User,
+        limit_choices_to={'role': User.PATIENT},
+        on_delete=models.CASCADE,
+        related_name='weight_summary'
+    )
+    latest_weight = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    latest_timestamp = models.DateTimeField(null=True, blank=True)
+    prev_weight = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # last record from before the latest one's day 
+    prev_timestamp = models.DateTimeField(null=True, blank=True)
+    avg_weight_7d = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # trailing 7 days, ending at the latest record 
+    record_count = models.PositiveIntegerField(default=0)
+    alert_state = models.JSONField(default=dict, blank=True)  # see api/utils/alert_rules.py 
+    last_updated = models.DateTimeField(auto_now=True)
+
+class AlertOutbox(models.Model):
+    """
+    Weight change alerts waiting to be emailed/texted to providers. Rows are written in the same 
+    transaction as the weight record that triggered them and delivered by `manage.py deliver_alerts`, 
+    so a slow or failing SMTP/Twilio call never affects the patient's request. 
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    patient = models.ForeignKey(
+        User,
+        limit_choices_to={'role': User.PATIENT},
+        on_delete=models.CASCADE,
+        related_name='alert_outbox'
+    )
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_to = models.JSONField(default=list, blank=True) # ids of the providers already sent this alert, not sent again on retry 
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='alertoutbox_due_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a write made with an `Idempotency-Key` header, so that a retry of the same request 
+    (e.g. after the mobile app lost the first response) gets the same answer instead of writing again. 
+    See api/utils/idempotency.py. A row without a status_code is a request still being processed. 
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotencykey_unique_user_key'),
+        ]
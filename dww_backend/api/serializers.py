@@ -1,16 +1,24 @@
 from rest_framework import serializers
 from .models import *
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.utils import timezone
 
 class WeightRecordSerializer(serializers.ModelSerializer):
+    measured_at = serializers.DateTimeField(source='timestamp', required=False)
+
     class Meta:
         model = WeightRecord
-        fields = ['weight']
+        fields = ['weight', 'measured_at', 'client_id']
 
     def validate_weight(self, value):
         if value <= 0:
             raise serializers.ValidationError("Weight must be a positive number")
         return value
+
+    def validate_measured_at(self, value):
+        if value > timezone.now() + timedelta(minutes=5):  # allow for some clock skew on the device 
+            raise serializers.ValidationError("Measurement time cannot be in the future")
+        return value
     
 class ReminderSerializer(serializers.ModelSerializer):
     days = serializers.ListField(child=serializers.CharField())
@@ -23,7 +31,7 @@ class ReminderSerializer(serializers.ModelSerializer):
         valid_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         if any(day.strip() not in valid_days for day in value):
             raise serializers.ValidationError("Invalid day(s) provided.")
-        return ", ".join(value)
+        return PatientReminder.days_to_mask(value)
     
     def validate_time(self, value):
         try:
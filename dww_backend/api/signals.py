@@ -0,0 +1,60 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from django.dispatch import receiver
+from api.models import (
+    User, TreatmentRelationship, PatientInfo, PatientNote, WeightSummary, NotificationPreference, ProviderNotification, 
+    PatientReminder
+)
+from api.utils.cache_utils import bump_version, invalidate_provider_dashboard, invalidate_patient_dashboards
+from api.utils.reminder_schedule import next_fire_time
+
+"""
+Cache invalidation. The provider dashboard only depends on the patients in the provider's treatment 
+relationships, their names/emails, their weight summaries (written by record_weight) and their 
+PatientInfo.alarm_threshold, so those are the saves and deletes we listen for. The other version 
+counters back the ETags in api/utils/conditional.py. Reminders are also scheduled here when saved. 
+"""
+
+@receiver([post_save, post_delete], sender=TreatmentRelationship)
+def treatment_relationship_changed(sender, instance, **kwargs):
+    invalidate_provider_dashboard(instance.provider_id)
+
+
+@receiver([post_save, post_delete], sender=WeightSummary)
+@receiver([post_save, post_delete], sender=PatientInfo)
+def patient_data_changed(sender, instance, **kwargs):
+    bump_version('patient_data', instance.patient_id)
+    invalidate_patient_dashboards(instance.patient_id)
+
+
+@receiver([post_save, post_delete], sender=PatientNote)
+def patient_note_changed(sender, instance, **kwargs):
+    bump_version('patient_data', instance.patient_id)
+
+
+@receiver([post_save, post_delete], sender=NotificationPreference)
+def notification_preference_changed(sender, instance, **kwargs):
+    bump_version('profile', instance.patient_id)
+
+
+@receiver([post_save, post_delete], sender=ProviderNotification)
+def provider_notification_changed(sender, instance, **kwargs):
+    bump_version('notifications', instance.provider_id)
+
+
+@receiver(post_save, sender=User)
+def account_changed(sender, instance, created, update_fields=None, **kwargs):
+    bump_version('profile', instance.id)
+    if instance.role != User.PATIENT or created:
+        return
+    if update_fields and not {'first_name', 'last_name', 'email'} & set(update_fields):
+        return
+    bump_version('patient_data', instance.id)
+    invalidate_patient_dashboards(instance.id)
+
+
+@receiver(pre_save, sender=PatientReminder)
+def schedule_reminder(sender, instance, update_fields=None, **kwargs):
+    # A new or edited reminder is scheduled from now; the reminder checker reschedules fired ones itself 
+    if update_fields is None or {'time', 'days'} & set(update_fields):
+        instance.next_fire_at = next_fire_time(instance, timezone.now())
@@ -0,0 +1,863 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from unittest import mock, skipUnless
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework_simplejwt.tokens import RefreshToken
+from api.models import (
+    User, TreatmentRelationship, NotificationPreference, WeightRecord, PatientInfo, AlertOutbox, PatientReminder,
+    ReminderDelivery, WeightSummary, IdempotencyKey
+)
+from api.utils import cache_utils, email_utils, sms_utils
+from api.utils.cache_utils import invalidate_provider_dashboard
+from api.utils.alert_rules import AlertRuleEngine
+from api.utils import alert_utils
+from api.utils.alert_utils import ALERT_LEASE, MAX_ALERT_ATTEMPTS, deliver_pending_alerts
+from api.utils.rate_limit import TokenBucket
+from api.utils.idempotency import IDEMPOTENCY_IN_FLIGHT_TIMEOUT, IDEMPOTENCY_KEY_TTL
+from api.utils.reminder_schedule import next_fire_time
+from api.utils.email_utils import html_email, send_emails, _percentile, claim_due_reminders, check_and_send_reminder_emails, REMINDER_DELIVERY_LEASE
+from api.utils.weight_history import decode_cursor, encode_cursor, largest_triangle_three_buckets
+from api.utils.weight_summary import rebuild_weight_summary
+
+# Benchmarks are slow and print timings, so they only run with DWW_BENCHMARKS=1, e.g. 
+#   DWW_BENCHMARKS=1 python manage.py test api --tag benchmark 
+RUN_BENCHMARKS = bool(os.environ.get('DWW_BENCHMARKS'))
+
+try:
+    from aiosmtpd.controller import Controller as SMTPController # only needed by EmailBenchmark, pip install aiosmtpd 
+except ImportError:
+    SMTPController = None
+
+
+def benchmark(cls):
+    return tag('benchmark')(skipUnless(RUN_BENCHMARKS, 'set DWW_BENCHMARKS=1 to run benchmarks')(cls))
+
+
+def jwt_headers(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+
+class RecordWeightQueryCountTest(TestCase):
+    """
+    An alerting record_weight must run the same number of queries however many providers the
+    patient has, so the per-provider N+1 can't come back.
+    """
+
+    def make_patient(self, provider_count):
+        patient = User.objects.create_user(email=f'patient{provider_count}@example.com', password='x')
+        for i in range(provider_count):
+            provider = User.objects.create_user(email=f'provider{provider_count}-{i}@example.com', password='x', role=User.PROVIDER)
+            NotificationPreference.objects.create(patient=provider, email_notifications=True, text_notifications=True)
+            TreatmentRelationship.objects.create(patient=patient, provider=provider)
+        return patient
+
+    def record_weight(self, patient, weight):
+        return self.client.post('/record_weight/', {'weight': weight}, content_type='application/json', **jwt_headers(patient))
+
+    def alerting_record_queries(self, provider_count):
+        patient = self.make_patient(provider_count)
+        self.assertEqual(self.record_weight(patient, 150).status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.record_weight(patient, 160).status_code, 201)
+        self.assertEqual(patient.alert_outbox.count(), 1)
+        return len(queries)
+
+    def test_query_count_independent_of_provider_count(self):
+        queries = self.alerting_record_queries(1)
+        patient = self.make_patient(10)
+        self.record_weight(patient, 150)
+        with self.assertNumQueries(queries):
+            self.record_weight(patient, 160)
+
+
+class RecordWeightTest(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='patient@example.com')
+
+    def record_weight(self, **data):
+        return self.client.post('/record_weight/', data, content_type='application/json', **jwt_headers(self.patient))
+
+    def test_measured_at_is_stored(self):
+        measured_at = timezone.now().replace(microsecond=0) - timedelta(hours=3)
+        self.assertEqual(self.record_weight(weight=150, measured_at=measured_at.isoformat()).status_code, 201)
+        self.assertEqual(WeightRecord.objects.get().timestamp, measured_at)
+        self.assertEqual(WeightSummary.objects.get(patient=self.patient).latest_timestamp, measured_at)
+
+    def test_future_measured_at_rejected(self):
+        response = self.record_weight(weight=150, measured_at=(timezone.now() + timedelta(hours=1)).isoformat())
+        self.assertEqual(response.status_code, 400)
+
+    def test_client_id_recorded_once(self):
+        self.assertEqual(self.record_weight(weight=150, client_id='abc').status_code, 201)
+        self.assertEqual(self.record_weight(weight=150, client_id='abc').status_code, 200)
+        self.assertEqual(WeightRecord.objects.count(), 1)
+
+    def test_back_dated_record_does_not_alert(self):
+        self.record_weight(weight=150)
+        self.record_weight(weight=170, measured_at=(timezone.now() - timedelta(days=3)).isoformat())
+        self.assertEqual(self.patient.alert_outbox.count(), 0)
+        self.assertEqual(WeightSummary.objects.get(patient=self.patient).latest_weight, 150)
+
+
+@mock.patch.object(cache_utils, 'STATS_FLUSH_INTERVAL', float('inf'))  # no hit/miss flush mid-test 
+class DashboardQueryCountTest(TestCase):
+    """
+    The provider dashboard is computed in a single query, so a provider with a large panel must cost
+    no more queries than one with a single patient.
+    """
+
+    def make_provider(self, patient_count):
+        provider = User.objects.create_user(email=f'provider{patient_count}@example.com', password='x', role=User.PROVIDER)
+        for i in range(patient_count):
+            patient = User.objects.create_user(email=f'patient{patient_count}-{i}@example.com', password='x')
+            TreatmentRelationship.objects.create(patient=patient, provider=provider)
+            PatientInfo.objects.create(patient=patient, alarm_threshold=5)
+            for days_ago in range(3):
+                WeightRecord.objects.create(patient=patient, weight=150 + days_ago, timestamp=timezone.now() - timedelta(days=days_ago))
+            rebuild_weight_summary(patient)
+        return provider
+
+    def dashboard_queries(self, provider):
+        self.client.force_login(provider)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['patients']
+
+    def test_query_count_independent_of_panel_size(self):
+        queries, patients = self.dashboard_queries(self.make_provider(1))
+        self.assertEqual(len(patients), 1)
+
+        self.client.force_login(self.make_provider(25))
+        with self.assertNumQueries(queries):
+            response = self.client.get('/dashboard/')
+        patients = response.json()['patients']
+        self.assertEqual(len(patients), 25)
+        self.assertEqual(float(patients[0]['latest_weight']), 150)
+        self.assertEqual(float(patients[0]['prev_weight']), 151)
+
+
+@mock.patch.object(cache_utils, 'STATS_FLUSH_INTERVAL', float('inf'))
+class DashboardCacheTest(TestCase):
+    """
+    Repeat dashboard requests are served from the in-process cache until a change bumps the 
+    dashboard's version. Only those cache lookups are counted as hits and misses, not 304s. 
+    """
+
+    def setUp(self):
+        caches['dashboard'].clear()
+        stats = mock.patch.dict(cache_utils._pending_stats, clear=True)
+        stats.start()
+        self.addCleanup(stats.stop)
+        self.provider = User.objects.create_user(email='provider@example.com', role=User.PROVIDER)
+        self.patient = User.objects.create_user(email='patient@example.com')
+        TreatmentRelationship.objects.create(patient=self.patient, provider=self.provider)
+        self.client.force_login(self.provider)
+
+    def stats(self):
+        return cache_utils._pending_stats.get('stats:dashboard:hits', 0), cache_utils._pending_stats.get('stats:dashboard:misses', 0)
+
+    def get(self, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dashboard/', **headers)
+        return response, len(queries)
+
+    def test_repeat_request_served_from_cache(self):
+        first, first_queries = self.get()
+        second, second_queries = self.get()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second_queries, first_queries - 1) # no dashboard query 
+        self.assertEqual(self.stats(), (1, 1))
+
+    def test_revalidation_is_not_a_hit(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+        self.assertEqual(self.stats(), (0, 1))
+
+    def test_invalidated_on_change(self):
+        self.get()
+        PatientInfo.objects.create(patient=self.patient, alarm_threshold=7)
+        invalidate_provider_dashboard(self.provider.id)
+        [patient] = self.get()[0].json()['patients']
+        self.assertEqual(float(patient['alarm_threshold']), 7)
+        self.assertEqual(self.stats(), (0, 2))
+
+
+def day(n):
+    return datetime(2026, 1, n, 8, tzinfo=dt_timezone.utc)
+
+
+class AlertRuleEngineTest(SimpleTestCase):
+
+    def replay(self, engine, weights):
+        """
+        Feed one weight per day through the engine, returning the rules that fired for each. 
+        """
+        state, fired = {}, []
+        for n, weight in enumerate(weights, start=1):
+            reasons, state = engine.evaluate(state, Decimal(weight), day(n))
+            fired.append(sorted(reasons))
+        return fired
+
+    def test_absolute_delta_uses_threshold(self):
+        engine = AlertRuleEngine(5, rule_names=['absolute_delta'])
+        self.assertEqual(self.replay(engine, [150, 154, 160]), [[], [], ['absolute_delta']])
+
+    def test_rolling_gain(self):
+        engine = AlertRuleEngine(5, rule_names=['rolling_gain'])
+        self.assertEqual(self.replay(engine, [150, 153, 156]), [[], [], ['rolling_gain']])
+
+    def test_threshold_crossing_fires_once_until_back_within(self):
+        engine = AlertRuleEngine(5, rule_names=['threshold_crossing'])
+        fired = self.replay(engine, [150, 150, 157, 158, 150, 150, 158])
+        self.assertEqual(fired, [[], [], ['threshold_crossing'], [], [], [], ['threshold_crossing']])
+
+    def test_evaluate_does_not_modify_state(self):
+        engine = AlertRuleEngine(5)
+        _, state = engine.evaluate({}, Decimal(150), day(1))
+        before = dict(state)
+        engine.evaluate(state, Decimal(170), day(2))
+        self.assertEqual(state, before)
+
+    def test_metric_patients_are_evaluated_in_lbs(self):
+        # Weights are stored in lbs, the unit only changes the message 
+        engine = AlertRuleEngine(5, unit='kg', rule_names=['absolute_delta'])
+        _, state = engine.evaluate({}, Decimal(150), day(1))
+        self.assertEqual(engine.evaluate(state, Decimal(153), day(2))[0], {})
+        reasons, _ = engine.evaluate(state, Decimal(160), day(2))
+        self.assertIn('+4.54 kg', reasons['absolute_delta'])
+
+    def test_percent_of_baseline_is_opt_in(self):
+        self.assertNotIn('percent_of_baseline', [rule.name for rule in AlertRuleEngine(5).rules])
+
+
+class AlarmThresholdTest(TestCase):
+
+    def test_change_within_alarm_threshold_queues_no_alert(self):
+        patient = User.objects.create_user(email='patient@example.com', password='x')
+        PatientInfo.objects.create(patient=patient, alarm_threshold=10)
+        for weight in [150, 156]:
+            response = self.client.post('/record_weight/', {'weight': weight}, content_type='application/json', **jwt_headers(patient))
+            self.assertEqual(response.status_code, 201)
+        self.assertFalse(AlertOutbox.objects.filter(patient=patient).exists())
+
+        self.client.post('/record_weight/', {'weight': 167}, content_type='application/json', **jwt_headers(patient))
+        self.assertTrue(AlertOutbox.objects.filter(patient=patient).exists())
+
+
+class IdempotencyTest(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='patient@example.com')
+
+    def record_weight(self, weight, key='key-1'):
+        return self.client.post(
+            '/record_weight/', {'weight': weight}, content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY=key, **jwt_headers(self.patient)
+        )
+
+    def mark_in_flight(self, age=timedelta(0)):
+        IdempotencyKey.objects.update(status_code=None, response_body=None, created_at=timezone.now() - age)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.record_weight(150)
+        retry = self.record_weight(150)
+        self.assertEqual((retry.status_code, retry.json()), (first.status_code, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(WeightRecord.objects.count(), 1)
+        self.assertEqual(self.record_weight(150, key='key-2').status_code, 201)
+        self.assertEqual(WeightRecord.objects.count(), 2)
+
+    def test_key_reused_for_a_different_request(self):
+        self.record_weight(150)
+        self.assertEqual(self.record_weight(151).status_code, 422)
+        self.assertEqual(WeightRecord.objects.count(), 1)
+
+    def test_request_in_flight(self):
+        self.record_weight(150)
+        self.mark_in_flight()
+        self.assertEqual(self.record_weight(150).status_code, 409)
+
+    def test_abandoned_request_taken_over(self):
+        self.record_weight(150)
+        self.mark_in_flight(IDEMPOTENCY_IN_FLIGHT_TIMEOUT + timedelta(seconds=1))
+        self.assertEqual(self.record_weight(151).status_code, 422) # only by a retry of the same request 
+
+        retry = self.record_weight(150)
+        self.assertEqual(retry.status_code, 201)
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+        self.assertEqual(self.record_weight(150)['Idempotent-Replayed'], 'true')
+
+    def test_expired_key_reused(self):
+        self.record_weight(150)
+        IdempotencyKey.objects.update(created_at=timezone.now() - IDEMPOTENCY_KEY_TTL - timedelta(seconds=1))
+        self.assertEqual(self.record_weight(151).status_code, 201)
+        self.assertEqual(WeightRecord.objects.count(), 2)
+
+
+class AlertRetryTest(TestCase):
+    """
+    An alert whose digest reached some of its providers is retried for the others only. 
+    """
+    real_send_alert_digest = staticmethod(alert_utils.send_alert_digest)
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='patient@example.com', password='x', first_name='Pat')
+        self.providers = []
+        for i in range(2):
+            provider = User.objects.create_user(email=f'provider{i}@example.com', password='x', role=User.PROVIDER)
+            NotificationPreference.objects.create(patient=provider, email_notifications=True, text_notifications=False)
+            TreatmentRelationship.objects.create(patient=self.patient, provider=provider)
+            self.providers.append(provider)
+        for weight in (150, 160):
+            self.client.post('/record_weight/', {'weight': weight}, content_type='application/json', **jwt_headers(self.patient))
+        self.alert = self.patient.alert_outbox.get()
+        self.failing = {self.providers[1].id}
+        self.digests = []
+
+    def send_alert_digest(self, provider, alerts, connection=None, texts=None):
+        self.digests.append(provider.id)
+        if provider.id in self.failing:
+            raise RuntimeError('SMTP server unavailable')
+        return self.real_send_alert_digest(provider, alerts, connection, texts)
+
+    def deliver(self):
+        AlertOutbox.objects.filter(status=AlertOutbox.PENDING).update(next_attempt_at=timezone.now()) # skip the backoff 
+        self.digests.clear()
+        mail.outbox.clear()
+        with mock.patch.object(alert_utils, 'send_alert_digest', self.send_alert_digest):
+            result = deliver_pending_alerts()
+        self.alert.refresh_from_db()
+        return result
+
+    def test_retry_skips_providers_already_sent(self):
+        self.assertEqual(self.deliver(), (0, 1))
+        self.assertEqual(self.alert.status, AlertOutbox.PENDING)
+        self.assertEqual(self.alert.sent_to, [self.providers[0].id])
+        self.assertEqual([message.to for message in mail.outbox], [[self.providers[0].email]])
+
+        self.failing.clear()
+        self.assertEqual(self.deliver(), (1, 0))
+        self.assertEqual(self.digests, [self.providers[1].id])
+        self.assertEqual([message.to for message in mail.outbox], [[self.providers[1].email]])
+        self.assertEqual(self.alert.status, AlertOutbox.SENT)
+        self.assertCountEqual(self.alert.sent_to, [provider.id for provider in self.providers])
+
+    def test_gives_up_after_max_attempts(self):
+        for _ in range(MAX_ALERT_ATTEMPTS):
+            self.assertEqual(self.alert.status, AlertOutbox.PENDING)
+            self.deliver()
+        self.assertEqual(self.alert.status, AlertOutbox.FAILED)
+        self.assertEqual(self.alert.attempts, MAX_ALERT_ATTEMPTS)
+        self.assertIn('SMTP server unavailable', self.alert.last_error)
+        self.assertEqual(self.deliver(), (0, 0))
+
+
+class ReminderDeliveryTest(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='patient@example.com', password='x')
+        NotificationPreference.objects.create(patient=self.patient, email_notifications=True)
+        self.reminder = PatientReminder.objects.create(patient=self.patient, time=datetime(2026, 1, 1, 9).time(), days=127)
+        self.now = timezone.now()
+        PatientReminder.objects.filter(id=self.reminder.id).update(next_fire_at=self.now - timedelta(minutes=1))
+
+    def test_due_reminder_is_sent_once(self):
+        stats = check_and_send_reminder_emails(self.now)
+        self.assertEqual((stats['due'], stats['sent']), (1, 1))
+        self.assertEqual(check_and_send_reminder_emails(self.now)['sent'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_reminder_claimed_by_a_dead_node_is_sent_after_the_lease(self):
+        claim_due_reminders(self.now) # the node dies before sending 
+        self.assertEqual(check_and_send_reminder_emails(self.now + timedelta(minutes=1))['sent'], 0)
+
+        stats = check_and_send_reminder_emails(self.now + REMINDER_DELIVERY_LEASE + timedelta(minutes=1))
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(ReminderDelivery.objects.get().status, ReminderDelivery.SENT)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_lost_reminder_past_the_grace_period_is_not_sent(self):
+        claim_due_reminders(self.now)
+        self.assertEqual(check_and_send_reminder_emails(self.now + timedelta(hours=2))['sent'], 0)
+        self.assertEqual(ReminderDelivery.objects.get().status, ReminderDelivery.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@mock.patch.object(email_utils, '_reminder_rate_limiter', TokenBucket(1000))
+class ReminderWorkerPoolTest(TestCase):
+    """
+    A tick's reminders are shared out between the worker threads, each sent once, and the tick 
+    reports what happened. 
+    """
+    REMINDERS = 12
+
+    def setUp(self):
+        self.now = timezone.now()
+        for i in range(self.REMINDERS):
+            patient = User.objects.create_user(email=f'patient{i}@example.com') # no password to hash 
+            NotificationPreference.objects.create(patient=patient, email_notifications=True)
+            PatientReminder.objects.create(patient=patient, time=datetime(2026, 1, 1, 9).time(), days=127)
+        PatientReminder.objects.update(next_fire_at=self.now - timedelta(minutes=1))
+
+    def test_every_reminder_sent_once(self):
+        with mock.patch.object(email_utils, 'get_connection', wraps=email_utils.get_connection) as get_connection:
+            stats = check_and_send_reminder_emails(self.now)
+        self.assertEqual((stats['due'], stats['sent'], stats['failed'], stats['skipped']), (self.REMINDERS, self.REMINDERS, 0, 0))
+        self.assertCountEqual([message.to[0] for message in mail.outbox], [f'patient{i}@example.com' for i in range(self.REMINDERS)])
+        self.assertEqual(get_connection.call_count, email_utils.REMINDER_MAX_WORKERS) # one per worker, not per email 
+        self.assertGreaterEqual(stats['max_lag'], 60)
+        self.assertLessEqual(stats['p50_latency'], stats['p99_latency'])
+        self.assertEqual(ReminderDelivery.objects.filter(status=ReminderDelivery.SENT).count(), self.REMINDERS)
+
+    def test_failed_send_recorded(self):
+        real_send_emails = email_utils.send_emails
+
+        def send_emails(messages, connection=None):
+            if messages[0].to == ['patient3@example.com']:
+                raise OSError('mailbox unavailable')
+            return real_send_emails(messages, connection)
+        with mock.patch.object(email_utils, 'send_emails', send_emails):
+            stats = check_and_send_reminder_emails(self.now)
+        self.assertEqual((stats['sent'], stats['failed']), (self.REMINDERS - 1, 1))
+        self.assertEqual(ReminderDelivery.objects.get(status=ReminderDelivery.FAILED).reminder.patient.email, 'patient3@example.com')
+
+    @mock.patch.object(email_utils, 'REMINDER_TICK_BUDGET', timedelta(0))
+    def test_overrun_reported(self):
+        self.assertGreater(check_and_send_reminder_emails(self.now)['overrun'], 0)
+
+    def test_percentile(self):
+        self.assertEqual(_percentile([], 99), 0)
+        self.assertEqual(_percentile([3, 1, 2], 50), 2)
+        self.assertEqual(_percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(_percentile([5], 1), 5)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class NextFireTimeTest(SimpleTestCase):
+    """
+    Reminder times are wall clock times in the patient's zone. In New York the clocks went forward 
+    at 2:00 on 2026-03-08 and back at 2:00 on 2026-11-01. 
+    """
+
+    def reminder(self, hour, minute, days=PatientReminder.days_to_mask(PatientReminder.WEEKDAYS)):
+        return PatientReminder(patient=User(time_zone='America/New_York'), time=dt_time(hour, minute), days=days)
+
+    def test_local_time_across_dst(self):
+        reminder = self.reminder(8, 0)
+        self.assertEqual(next_fire_time(reminder, utc(2026, 3, 7, 14)), utc(2026, 3, 8, 12))  # 8:00 EDT 
+        self.assertEqual(next_fire_time(reminder, utc(2026, 3, 6, 14)), utc(2026, 3, 7, 13))  # 8:00 EST 
+        self.assertEqual(next_fire_time(reminder, utc(2026, 11, 1, 0)), utc(2026, 11, 1, 13))  # 8:00 EST 
+
+    def test_skipped_time_fires_an_hour_later(self):
+        self.assertEqual(next_fire_time(self.reminder(2, 30), utc(2026, 3, 8, 5)), utc(2026, 3, 8, 7, 30))  # 3:30 EDT 
+
+    def test_repeated_time_fires_once(self):
+        reminder = self.reminder(1, 30)
+        first = next_fire_time(reminder, utc(2026, 11, 1, 4))
+        self.assertEqual(first, utc(2026, 11, 1, 6, 30))  # the second 1:30, EST 
+        self.assertEqual(next_fire_time(reminder, first), utc(2026, 11, 2, 6, 30))
+
+    def test_only_on_selected_days(self):
+        reminder = self.reminder(8, 0, days=PatientReminder.days_to_mask(['Monday']))
+        self.assertEqual(next_fire_time(reminder, utc(2026, 10, 14, 12)), utc(2026, 10, 19, 12))  # Wed -> Mon 
+        self.assertIsNone(next_fire_time(self.reminder(8, 0, days=0), utc(2026, 10, 14, 12)))
+
+
+class RegisterTimeZoneTest(TestCase):
+
+    def register(self, **fields):
+        return self.client.post('/register/', {
+            'first_name': 'Pat', 'last_name': 'Ient', 'email': 'pat@example.com', 'role': 'patient',
+            'password1': 'a-long-password-1', 'password2': 'a-long-password-1', **fields,
+        }, content_type='application/json')
+
+    @mock.patch('api.views.patient_views.send_verification_email')
+    def test_device_time_zone_saved(self, _):
+        self.assertEqual(self.register(time_zone='Europe/Paris').status_code, 201)
+        self.assertEqual(User.objects.get(email='pat@example.com').time_zone, 'Europe/Paris')
+
+    @mock.patch('api.views.patient_views.send_verification_email')
+    def test_missing_time_zone_defaults(self, _):
+        self.assertEqual(self.register().status_code, 201)
+        self.assertEqual(User.objects.get(email='pat@example.com').time_zone, 'America/New_York')
+
+    def test_unknown_time_zone_rejected(self):
+        self.assertEqual(self.register(time_zone='Mars/Olympus').status_code, 400)
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('api.utils.rate_limit.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_refill(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        self.assertEqual([bucket.acquire(block=False) for _ in range(4)], [True, True, True, False])
+        self.now += 0.5  # one token at 2/s 
+        self.assertEqual([bucket.acquire(block=False) for _ in range(2)], [True, False])
+        self.now += 60  # never more than the capacity 
+        self.assertEqual(sum(bucket.acquire(block=False) for _ in range(10)), 3)
+
+    def test_blocking_acquire_waits_for_the_next_token(self):
+        bucket = TokenBucket(rate=4, capacity=1)
+        bucket.acquire()
+
+        def sleep(seconds):
+            self.assertAlmostEqual(seconds, 0.25)
+            self.now += seconds
+        with mock.patch('api.utils.rate_limit.time.sleep', side_effect=sleep) as sleeper:
+            self.assertTrue(bucket.acquire())
+        self.assertEqual(sleeper.call_count, 1)
+
+    def test_default_capacity_and_bad_rate(self):
+        self.assertEqual(TokenBucket(rate=10).capacity, 10)
+        self.assertEqual(TokenBucket(rate=0.5).capacity, 1)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class SendTimeoutTest(SimpleTestCase):
+    """
+    A hung SMTP server or Twilio API must fail the send well before the alert's lease runs out, 
+    otherwise a second worker claims the alert and the provider is notified twice. 
+    """
+
+    def test_email_timeout_under_lease(self):
+        self.assertLess(mail.get_connection('django.core.mail.backends.smtp.EmailBackend').timeout, ALERT_LEASE.total_seconds() / 10)
+
+    @override_settings(TWILIO_SID='ACtest', TWILIO_TOKEN='token')
+    @mock.patch.object(sms_utils, '_client', None)
+    def test_twilio_timeout_under_lease(self):
+        timeout = sms_utils.get_twilio_client().http_client.timeout
+        self.assertEqual(timeout, settings.TWILIO_TIMEOUT)
+        self.assertLess(timeout, ALERT_LEASE.total_seconds() / 10)
+
+
+class WeightHistoryPagingTest(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='patient@example.com', password='x')
+        # Several records share a timestamp, the id breaks the tie 
+        timestamps = [utc(2026, 1, 1), utc(2026, 1, 2), utc(2026, 1, 2), utc(2026, 1, 2), utc(2026, 1, 3)]
+        self.ids = [
+            WeightRecord.objects.create(patient=self.patient, weight=150 + i, timestamp=timestamp).id
+            for i, timestamp in enumerate(timestamps)
+        ]
+
+    def get(self, **params):
+        return self.client.get('/get-weight-record/', params, **jwt_headers(self.patient))
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(utc(2026, 1, 2, 3, 4, 5), 42)), (utc(2026, 1, 2, 3, 4, 5), 42))
+        for cursor in ('garbage', encode_cursor(utc(2026, 1, 1), 1)[:-4]):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_pages_cover_every_record_once(self):
+        ids, pages, cursor = [], 0, None
+        while True:
+            response = self.get(limit=2, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 201)
+            ids += [row['id'] for row in response.json()]
+            pages += 1
+            cursor = response.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(ids, self.ids)
+        self.assertEqual(pages, 3)
+
+    def test_since_id_only_returns_newer_records(self):
+        self.assertEqual([row['id'] for row in self.get(since_id=self.ids[2]).json()], self.ids[3:])
+
+    def test_bad_parameters_rejected(self):
+        for params in ({'cursor': 'garbage'}, {'limit': 0}, {'limit': 'x'}, {'since_id': 'x'}, {'since': 'yesterday'}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+    def test_unchanged_history_is_not_modified(self):
+        etag = self.get(since_id=self.ids[-1])['ETag']
+        response = self.client.get('/get-weight-record/', {'since_id': self.ids[-1]}, HTTP_IF_NONE_MATCH=etag, **jwt_headers(self.patient))
+        self.assertEqual(response.status_code, 304)
+
+
+class LargestTriangleThreeBucketsTest(SimpleTestCase):
+
+    def test_short_series_unchanged(self):
+        points = [(x, x, x) for x in range(5)]
+        self.assertEqual(largest_triangle_three_buckets(points, 5), [0, 1, 2, 3, 4])
+
+    def test_keeps_ends_and_spikes(self):
+        # A flat series with one spike in each bucket: the spikes are the biggest triangles
+        points = [(x, 100 if x in (25, 75) else 0, x) for x in range(100)]
+        sampled = largest_triangle_three_buckets(points, 4)
+        self.assertEqual(sampled, [0, 25, 75, 99])
+
+    def test_tiny_max_points(self):
+        points = [(x, x, x) for x in range(10)]
+        self.assertEqual(largest_triangle_three_buckets(points, 2), [0, 9])
+        self.assertEqual(largest_triangle_three_buckets(points, 1), [0])
+
+
+class BucketedWeightHistoryTest(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='patient@example.com', password='x')
+        # Two evenings in New York that are already the next day in UTC
+        for hour, weight in ((23, 150), (25, 152)):
+            WeightRecord.objects.create(
+                patient=self.patient, weight=weight,
+                timestamp=datetime(2026, 1, 10, tzinfo=dt_timezone.utc) + timedelta(hours=hour),
+            )
+
+    def daily(self, **params):
+        response = self.client.get('/get-weight-record/', {'resolution': 'daily', **params}, **jwt_headers(self.patient))
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_days_follow_the_requested_time_zone(self):
+        self.assertEqual([bucket['count'] for bucket in self.daily(tz='UTC')], [1, 1])
+        [bucket] = self.daily(tz='America/New_York')
+        self.assertEqual(bucket['count'], 2)
+        self.assertEqual(Decimal(bucket['avg_weight']), 151)
+        self.assertEqual(datetime.fromisoformat(bucket['timestamp']), datetime(2026, 1, 10, 5, tzinfo=dt_timezone.utc))
+
+    def test_unknown_time_zone_rejected(self):
+        response = self.client.get('/get-weight-record/', {'resolution': 'daily', 'tz': 'Mars/Olympus'}, **jwt_headers(self.patient))
+        self.assertEqual(response.status_code, 400)
+
+
+@benchmark
+class StartupBenchmark(SimpleTestCase):
+    """
+    Loading Django (what every gunicorn worker, migrate and shell does) must not start any threads; 
+    periodic work belongs to `manage.py run_scheduler`. 
+    """
+    RUNS = 5
+    SCRIPT = (
+        "import time, threading; started = time.perf_counter(); import django; django.setup(); "
+        "print(time.perf_counter() - started, threading.active_count())"
+    )
+
+    def test_setup_time_and_threads(self):
+        timings = []
+        for _ in range(self.RUNS):
+            output = subprocess.run([sys.executable, '-c', self.SCRIPT], capture_output=True, text=True, check=True).stdout
+            seconds, threads = output.split()[-2:]
+            timings.append(float(seconds))
+            self.assertEqual(int(threads), 1)
+        print(f"\ndjango.setup(): median {statistics.median(timings) * 1000:.0f} ms over {self.RUNS} runs, no background threads")
+        self.assertLess(statistics.median(timings), 5)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class SlowSMTPHandler:
+    """
+    An aiosmtpd handler that accepts everything, with a delay for opening a session (standing in 
+    for the TCP and TLS handshakes) and for each message, and counts the connections it was sent. 
+    """
+
+    def __init__(self, connect_latency, message_latency):
+        self.connect_latency = connect_latency
+        self.message_latency = message_latency
+        self.connections = 0
+        self.messages = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.connect_latency)
+        self.connections += 1 # once per connection, no STARTTLS here 
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.message_latency)
+        self.messages += 1
+        return '250 OK'
+
+
+@benchmark
+@skipUnless(SMTPController, 'pip install aiosmtpd to run the email benchmark')
+class EmailBenchmark(SimpleTestCase):
+    """
+    A batch of emails over a real (local) SMTP server: send_emails reuses one connection, where 
+    sending each message on its own pays for a new connection every time. 
+    """
+    MESSAGES = 50
+    CONNECT_LATENCY = 0.05  # seconds 
+    MESSAGE_LATENCY = 0.005
+
+    def setUp(self):
+        self.handler = SlowSMTPHandler(self.CONNECT_LATENCY, self.MESSAGE_LATENCY)
+        self.smtp = SMTPController(self.handler, hostname='127.0.0.1', port=free_port())
+        self.smtp.start()
+        self.addCleanup(self.smtp.stop)
+        settings_override = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.port, EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def messages(self):
+        return [html_email('Reminder', '<p>Time to weigh in</p>', [f'patient{i}@example.com']) for i in range(self.MESSAGES)]
+
+    def timed(self, send):
+        self.handler.connections = self.handler.messages = 0
+        started = time.perf_counter()
+        send(self.messages())
+        elapsed = time.perf_counter() - started
+        self.assertEqual(self.handler.messages, self.MESSAGES)
+        return elapsed, self.handler.connections
+
+    def test_pooled_connection(self):
+        one_by_one, one_by_one_connections = self.timed(lambda messages: [message.send() for message in messages])
+        pooled, pooled_connections = self.timed(send_emails)
+        print(
+            f"\n{self.MESSAGES} emails: {one_by_one:.2f}s over {one_by_one_connections} connections one by one, "
+            f"{pooled:.2f}s over {pooled_connections} connection with send_emails"
+        )
+        self.assertEqual(one_by_one_connections, self.MESSAGES)
+        self.assertEqual(pooled_connections, 1)
+        self.assertLess(pooled, one_by_one / 3)
+
+
+@benchmark
+class SMSBenchmark(SimpleTestCase):
+    """
+    A batch of texts against the fake_twilio command: the thread pool must send them several times 
+    faster than one at a time, while never going over the rate limit. 
+    """
+    MESSAGES = 40
+    LATENCY = 0.1  # seconds per Twilio API request 
+
+    def setUp(self):
+        port = free_port()
+        self.server = subprocess.Popen(
+            [sys.executable, 'manage.py', 'fake_twilio', '--port', str(port), '--latency', str(self.LATENCY)],
+            cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.addCleanup(self.server.wait)
+        self.addCleanup(self.server.terminate)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        settings_override = override_settings(
+            TWILIO_SID='ACbenchmark', TWILIO_TOKEN='token', TWILIO_PHONE='+15550000000',
+            TWILIO_API_URL=f'http://127.0.0.1:{port}',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        client_patch = mock.patch.object(sms_utils, '_client', None)
+        client_patch.start()
+        self.addCleanup(client_patch.stop)
+
+    def send(self, rate):
+        messages = [(f'+1555000{i:04d}', 'Time to weigh in') for i in range(self.MESSAGES)]
+        with mock.patch.object(sms_utils, '_rate_limiter', TokenBucket(rate)):
+            started = time.perf_counter()
+            sent = sms_utils.send_texts(messages)
+            elapsed = time.perf_counter() - started
+        self.assertEqual(sent, self.MESSAGES)
+        return elapsed
+
+    def test_concurrent_sends(self):
+        one_at_a_time = self.MESSAGES * self.LATENCY
+        elapsed = self.send(rate=1000)
+        print(f"\n{self.MESSAGES} texts at {self.LATENCY * 1000:.0f} ms each: {elapsed:.2f}s ({self.MESSAGES / elapsed:.0f}/s), {one_at_a_time:.1f}s one at a time")
+        self.assertLess(elapsed, one_at_a_time / 4)
+
+    def test_rate_limit_holds(self):
+        rate = 20
+        elapsed = self.send(rate)
+        print(f"\n{self.MESSAGES} texts limited to {rate}/s: {elapsed:.2f}s")
+        # The first second's worth goes out as a burst, the rest at the rate 
+        self.assertGreaterEqual(elapsed, (self.MESSAGES - rate) / rate * 0.95)
+
+
+@benchmark
+@mock.patch.object(cache_utils, 'STATS_FLUSH_INTERVAL', float('inf'))
+class DashboardBenchmark(TestCase):
+    """
+    The dashboard for panels of 100, 1k and 10k patients: the same number of queries as for a single 
+    patient, and the median of a few fresh (uncached) builds within the size's latency budget. 
+    """
+    RUNS = 5
+    LATENCY_BUDGET = {100: 0.1, 1000: 0.3, 10000: 1.0}  # seconds 
+
+    def seed_provider(self, patient_count):
+        provider = User.objects.create_user(email=f'provider{patient_count}@example.com', password='x', role=User.PROVIDER)
+        patients = User.objects.bulk_create([
+            User(email=f'patient{patient_count}-{i}@example.com', password='!', role=User.PATIENT, first_name='P', last_name=str(i))
+            for i in range(patient_count)
+        ])
+        if patients[0].id is None: # MySQL doesn't return the ids of bulk inserted rows 
+            patients = list(User.objects.filter(email__startswith=f'patient{patient_count}-'))
+        now = timezone.now()
+        TreatmentRelationship.objects.bulk_create([TreatmentRelationship(patient=patient, provider=provider) for patient in patients])
+        PatientInfo.objects.bulk_create([PatientInfo(patient=patient, alarm_threshold=5) for patient in patients])
+        WeightSummary.objects.bulk_create([
+            WeightSummary(
+                patient=patient, latest_weight=150, latest_timestamp=now, prev_weight=151,
+                prev_timestamp=now - timedelta(days=1), record_count=2
+            )
+            for patient in patients
+        ])
+        return provider
+
+    def fresh_dashboard(self, provider):
+        invalidate_provider_dashboard(provider.id) # measure building it, not a cache hit 
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get('/dashboard/')
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, 200)
+        return len(queries), elapsed, len(response.json()['patients'])
+
+    def test_panel_sizes(self):
+        single = self.seed_provider(1)
+        self.client.force_login(single)
+        baseline_queries, _, _ = self.fresh_dashboard(single)
+
+        for size, budget in self.LATENCY_BUDGET.items():
+            provider = self.seed_provider(size)
+            self.client.force_login(provider)
+            runs = [self.fresh_dashboard(provider) for _ in range(self.RUNS)]
+            latency = statistics.median(elapsed for _, elapsed, _ in runs)
+            print(f"\ndashboard, {size} patients: {runs[0][0]} queries, median {latency * 1000:.1f} ms")
+            for queries, _, patient_count in runs:
+                self.assertEqual(queries, baseline_queries)
+                self.assertEqual(patient_count, size)
+            self.assertLess(latency, budget)
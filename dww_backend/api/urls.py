@@ -25,9 +25,11 @@ urlpatterns = [
     path('patient-profile/', patient_views.patient_profile_data, name='patient-profile'),
     path('patient-change-password/', patient_views.patient_change_password, name='patient_change_password'),
     path('update-unit-preference/', patient_views.update_unit_preference, name='update_unit_preference'),
+    path('update-timezone/', patient_views.update_timezone, name='update_timezone'),
     ## Patient data 
     path('get-weight-record/', patient_views.get_weight_record, name='get weight record'),
     path('record_weight/', patient_views.record_weight, name='record weight'), 
+    path('record_weights/', patient_views.record_weights, name='record weights'), 
     path('get-patient-notes/', patient_views.get_patient_notes, name='get patient notes'),
     ## Reminders 
     path('get-reminders/', patient_reminder_views.get_reminders, name='get_reminders'),
@@ -47,6 +49,9 @@ urlpatterns = [
     path('add-patient-note', provider_views.add_patient_note, name='add_patient_note'), 
     path('delete-patient-note', provider_views.delete_patient_note, name='delete_patient_note'), 
     path('add-patient-info', provider_views.add_patient_info, name='add_patient_info'), 
+    path('export-patient-panel/', provider_views.export_patient_panel, name='export_patient_panel'), 
     path('get-provider-notifications/', provider_views.get_provider_notifications, name='get_provider_notifications'), 
     path('mark-notification-as-read/<int:id>/', provider_views.mark_notification_as_read, name='mark_notification_as_read'), 
+    path('mark-notifications-as-read/', provider_views.mark_notifications_as_read, name='mark_notifications_as_read'),
+    path('get-unread-notification-count/', provider_views.get_unread_notification_count, name='get_unread_notification_count'),
 ]
\ No newline at end of file
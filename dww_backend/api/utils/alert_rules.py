@@ -0,0 +1,144 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from api.models import User, PatientInfo
+
+"""
+Rule-based weight change alerts.
+
+Rules are evaluated incrementally: each new weight is checked against a small per-patient state
+(stored in WeightSummary.alert_state) instead of the patient's history, so a new record costs the
+same amount of work however long the history is. The state holds the last weight, the last weight
+of each of the most recent BASELINE_DAYS days, and whether the patient is currently outside their
+alarm threshold.
+"""
+
+LBS_PER_KG = Decimal('2.20462')
+DEFAULT_ALARM_THRESHOLD_LBS = Decimal('5')
+DEFAULT_PERCENT_THRESHOLD = Decimal('3')
+BASELINE_DAYS = 7
+ROLLING_GAIN_DAYS = 3
+
+
+def _daily_weights(state, since):
+    return [Decimal(weight) for day, weight in state.get('days', []) if date.fromisoformat(day) >= since]
+
+
+def _baseline(state, day):
+    """
+    Average of the last weight of each of the previous BASELINE_DAYS days, our stand-in for the
+    patient's dry weight.
+    """
+    weights = _daily_weights(state, day - timedelta(days=BASELINE_DAYS))
+    return sum(weights) / len(weights) if weights else None
+
+
+class AbsoluteDeltaRule:
+    name = 'absolute_delta'
+
+    def evaluate(self, engine, state, weight, day):
+        if state.get('last_weight') is None:
+            return None
+        change = weight - Decimal(state['last_weight'])
+        if abs(change) > engine.threshold:
+            return f"changed by {engine.display(change):+.2f} {engine.unit} since the last record"
+
+
+class PercentOfBaselineRule:
+    name = 'percent_of_baseline'
+
+    def evaluate(self, engine, state, weight, day):
+        baseline = _baseline(state, day)
+        if not baseline:
+            return None
+        percent = (weight - baseline) / baseline * 100
+        if abs(percent) > engine.percent_threshold:
+            return f"is {percent:+.1f}% from their {BASELINE_DAYS}-day baseline"
+
+
+class RollingGainRule:
+    name = 'rolling_gain'
+
+    def evaluate(self, engine, state, weight, day):
+        recent = _daily_weights(state, day - timedelta(days=ROLLING_GAIN_DAYS))
+        if not recent:
+            return None
+        gain = weight - min(recent)
+        if gain > engine.threshold:
+            return f"gained {engine.display(gain):.2f} {engine.unit} over the last {ROLLING_GAIN_DAYS} days"
+
+
+class ThresholdCrossingRule:
+    """
+    Fires when the weight moves from within the alarm threshold of the baseline to outside of it,
+    but not again until it has come back within the threshold.
+    """
+    name = 'threshold_crossing'
+
+    def evaluate(self, engine, state, weight, day):
+        baseline = _baseline(state, day)
+        if baseline is None or state.get('outside_threshold'):
+            return None
+        if abs(weight - baseline) > engine.threshold:
+            return f"moved outside the alarm threshold of {engine.display(engine.threshold):.2f} {engine.unit} from their baseline"
+
+
+ALERT_RULES = {rule.name: rule for rule in [AbsoluteDeltaRule, PercentOfBaselineRule, RollingGainRule, ThresholdCrossingRule]}
+
+# The rules that follow the patient's alarm threshold. percent_of_baseline has a fixed limit of its 
+# own that a provider can't raise for a patient, so it is only used if listed in settings.ALERT_RULES 
+DEFAULT_ALERT_RULES = ['absolute_delta', 'rolling_gain', 'threshold_crossing']
+
+
+class AlertRuleEngine:
+    """
+    Weights and the threshold are always in lbs, the unit WeightRecord and PatientInfo store them 
+    in. `unit` is only the unit the reasons are written in, see display(). 
+    """
+    def __init__(self, threshold, unit='lbs', percent_threshold=DEFAULT_PERCENT_THRESHOLD, rule_names=None):
+        self.threshold = Decimal(threshold)
+        self.unit = unit
+        self.percent_threshold = Decimal(percent_threshold)
+        rule_names = rule_names or getattr(settings, 'ALERT_RULES', DEFAULT_ALERT_RULES)
+        self.rules = [ALERT_RULES[name]() for name in rule_names]
+
+    def display(self, lbs):
+        """
+        A weight or weight change in lbs, converted to the unit the patient reads. 
+        """
+        return lbs / LBS_PER_KG if self.unit == 'kg' else lbs
+
+    @classmethod
+    def for_patient(cls, patient: User, **kwargs):
+        """
+        Engine configured with the patient's PatientInfo.alarm_threshold (or the default 5 lbs),
+        reporting in the patient's preferred unit.
+        """
+        threshold = PatientInfo.objects.filter(patient=patient).values_list('alarm_threshold', flat=True).first()
+        if threshold is None:
+            threshold = DEFAULT_ALARM_THRESHOLD_LBS
+        return cls(threshold, unit='kg' if patient.unit_preference == User.METRIC else 'lbs', **kwargs)
+
+    def evaluate(self, state, weight, timestamp):
+        """
+        Check a new weight against the rules. Returns {rule name: reason} for the rules that fired and
+        the patient's updated state; the state passed in is not modified.
+        """
+        weight = Decimal(weight)
+        day = timestamp.date()
+        reasons = {}
+        for rule in self.rules:
+            reason = rule.evaluate(self, state, weight, day)
+            if reason:
+                reasons[rule.name] = reason
+
+        baseline = _baseline(state, day)
+        days = [entry for entry in state.get('days', []) if entry[0] != day.isoformat()]
+        days.append([day.isoformat(), str(weight)])
+        oldest = (day - timedelta(days=BASELINE_DAYS)).isoformat()
+        new_state = {
+            'last_weight': str(weight),
+            'days': [entry for entry in days if entry[0] > oldest][-BASELINE_DAYS:],
+            'outside_threshold': baseline is not None and abs(weight - baseline) > self.threshold,
+        }
+        return reasons, new_state
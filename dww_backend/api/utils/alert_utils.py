@@ -0,0 +1,269 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+from api.models import TreatmentRelationship, ProviderNotification, AlertOutbox
+from api.utils.alert_rules import AlertRuleEngine
+from api.utils.cache_utils import bump_versions
+from api.utils.email_utils import html_email, send_emails
+from api.utils.sms_utils import send_texts
+
+MAX_ALERT_ATTEMPTS = 5
+ALERT_LEASE = timedelta(minutes=5)  # how long a claimed alert is left to its worker before another may retry it 
+
+
+def weight_change_message(patient, weight_change):
+    reasons = weight_change.get('reasons') or [f"has experienced a dramatic weight change of {weight_change['change']} lbs"]
+    combined = f" ({weight_change['alert_count']} alerts combined)" if weight_change.get('alert_count', 1) > 1 else ""
+    return f"Patient {patient.first_name} {patient.last_name} {'; '.join(reasons)}{combined}. Please review the patient's data and take appropriate action if needed."
+
+
+def get_alert_providers(patient_ids):
+    """
+    {patient id: [providers]} for the given patients, with the providers' notification preferences, 
+    in one query. 
+    """
+    providers = {}
+    relationships = TreatmentRelationship.objects.filter(patient_id__in=patient_ids).select_related('provider__notification_preference')
+    for relationship in relationships:
+        providers.setdefault(relationship.patient_id, []).append(relationship.provider)
+    return providers
+
+
+def _coalesce_window():
+    return timedelta(seconds=settings.ALERT_COALESCE_WINDOW)
+
+
+def _next_digest_time(earliest):
+    """
+    The first multiple of the coalescing window at or after `earliest`. Held back alerts of different 
+    patients come due at the same moments, so the worker can send a provider one digest for them. 
+    """
+    step = _coalesce_window().total_seconds()
+    return datetime.fromtimestamp(math.ceil(earliest.timestamp() / step) * step, tz=dt_timezone.utc)
+
+
+def merge_weight_changes(earlier, later):
+    """
+    One alert covering two consecutive ones: the change from before the first to after the second, 
+    with the reasons of the latest. 
+    """
+    merged = dict(later)
+    merged['previous_weight'] = earlier['previous_weight']
+    if earlier['previous_weight'] is not None:
+        merged['change'] = round(later['new_weight'] - earlier['previous_weight'], 2)
+    merged['alert_count'] = earlier.get('alert_count', 1) + later.get('alert_count', 1)
+    return merged
+
+
+def queue_weight_change_alert(patient, weight_change):
+    """
+    Queue an email/SMS alert for the patient in the outbox. Alerts are coalesced per patient: if one 
+    is still waiting to be sent it absorbs the new one, and a patient who was alerted less than 
+    ALERT_COALESCE_WINDOW seconds ago has the new alert held back until the window has passed. 
+    Returns the weight change the providers will be sent. 
+    """
+    # Rows a worker has claimed have attempts > 0 (and are skipped while it is claiming them), so an 
+    # alert is never merged into one that is being sent right now 
+    pending = AlertOutbox.objects.select_for_update(skip_locked=True).filter(
+        patient=patient,
+        status=AlertOutbox.PENDING,
+        attempts=0
+    ).order_by('id').first()
+    if pending:
+        pending.payload = merge_weight_changes(pending.payload, weight_change)
+        pending.save(update_fields=['payload'])
+        return pending.payload
+
+    next_attempt_at = timezone.now()
+    if settings.ALERT_COALESCE_WINDOW:
+        last_sent_at = AlertOutbox.objects.filter(patient=patient, status=AlertOutbox.SENT).order_by('-sent_at').values_list('sent_at', flat=True).first()
+        if last_sent_at and last_sent_at + _coalesce_window() > next_attempt_at:
+            next_attempt_at = _next_digest_time(last_sent_at + _coalesce_window())
+    AlertOutbox.objects.create(patient=patient, payload=weight_change, next_attempt_at=next_attempt_at)
+    return weight_change
+
+
+def notify_providers(patient, message):
+    """
+    In-app notifications for the patient's providers. A provider who already has an unread 
+    notification about this patient from within the coalescing window gets that one updated 
+    instead of another. 
+    """
+    now = timezone.now()
+    provider_ids = list(patient.treatment_patients.values_list('provider_id', flat=True))
+    recent = ProviderNotification.objects.filter(
+        patient=patient,
+        provider_id__in=provider_ids,
+        is_read=False,
+        created_at__gte=now - _coalesce_window()
+    )
+    updated_provider_ids = set(recent.values_list('provider_id', flat=True)) if settings.ALERT_COALESCE_WINDOW else set()
+    if updated_provider_ids:
+        recent.update(message=message, created_at=now)
+    ProviderNotification.objects.bulk_create([
+        ProviderNotification(provider_id=provider_id, patient=patient, message=message)
+        for provider_id in provider_ids if provider_id not in updated_provider_ids
+    ])
+    bump_versions('notifications', provider_ids) # neither update() nor bulk_create sends post_save
+
+
+def check_and_notify_weight_change(patient, summary, records):
+    """
+    Run the patient's new weight records (in chronological order) through the alert rules, starting 
+    from the state kept on their WeightSummary. If any rule fires, queue an email/SMS alert in the 
+    outbox for the last record that triggered and notify the providers in-app (both coalesced, see 
+    queue_weight_change_alert). The advanced state is set on `summary` for the caller to save. 
+
+    Meant to be called inside the transaction that saves the new weight records, so the alert 
+    exists if and only if the records do. 
+    """
+    engine = AlertRuleEngine.for_patient(patient)
+    state = summary.alert_state
+    previous_weight = summary.latest_weight
+    weight_change_data = None
+
+    for record in records:
+        reasons, state = engine.evaluate(state, record.weight, record.timestamp)
+        if reasons:
+            weight_change_data = { # in the unit the providers are told, the patient's preferred one 
+                "previous_weight": round(float(engine.display(previous_weight)), 2) if previous_weight is not None else None,
+                "new_weight": round(float(engine.display(record.weight)), 2),
+                "change": round(float(engine.display(record.weight - previous_weight)), 2) if previous_weight is not None else 0.0,
+                "unit": engine.unit,
+                "reasons": list(reasons.values()),
+            }
+        previous_weight = record.weight
+    summary.alert_state = state
+
+    if weight_change_data:
+        weight_change_data = queue_weight_change_alert(patient, weight_change_data)
+        notify_providers(patient, weight_change_message(patient, weight_change_data))
+
+
+def send_alert_digest(provider, alerts, connection=None, texts=None): # called by the outbox worker, see deliver_pending_alerts
+    """
+    Email and text a provider about the given outbox alerts, as one message each. If a `texts` list 
+    is passed, the text is appended to it as (phone, message) for the caller to send instead, so 
+    the texts of several digests can go out together with send_texts. 
+    """
+    subject = "Alert: Drastic Weight Change Detected" if len(alerts) == 1 else f"Alert: Drastic Weight Changes Detected for {len(alerts)} Patients"
+    changes = "".join(
+        f"""<p style="color: #555; font-size: 16px;">{alert.patient.first_name} {alert.patient.last_name} - Change: {alert.payload['change']} {alert.payload.get('unit', 'lbs')}</p>"""
+        for alert in alerts
+    )
+
+    message_content = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; background-color: #f9f9f9; margin: 0; padding: 20px;">
+        <table width="100%" cellpadding="0" cellspacing="0" style="max-width: 600px; margin: 0 auto; background-color: #ffffff; border: 1px solid #ddd; border-radius: 8px; padding: 20px;">
+          <tr>
+            <td style="text-align: center; padding-bottom: 20px;">
+              <h1 style="color: #333; font-size: 24px;">Weight Change Alert</h1>
+              <p style="color: #555; font-size: 16px;">{"One of your patients has" if len(alerts) == 1 else f"{len(alerts)} of your patients have"} experienced a significant weight change.</p>
+              {changes}
+            </td>
+          </tr>
+          <tr>
+            <td style="text-align: center; padding-top: 20px; font-size: 14px; color: #999;">
+              Please review the patient's data and take appropriate action if needed.
+            </td>
+          </tr>
+        </table>
+      </body>
+    </html>
+    """
+
+    preference = getattr(provider, 'notification_preference', None)
+    if preference and preference.email_notifications:
+        send_emails([html_email(subject, message_content, [provider.email])], connection)
+
+    if provider.phone and preference and preference.text_notifications:
+        message = "\n".join(weight_change_message(alert.patient, alert.payload) for alert in alerts)
+        if texts is None:
+            send_texts([(provider.phone, message)])
+        else:
+            texts.append((provider.phone, message))
+
+
+def claim_due_alerts(batch_size=50):
+    """
+    Claim up to `batch_size` due outbox alerts in a short transaction: lock them with SELECT ... FOR 
+    UPDATE SKIP LOCKED (so workers take different ones), count the attempt and push next_attempt_at 
+    back by ALERT_LEASE, so no other worker picks them up while they are being sent. A worker that 
+    dies mid-send leaves its alerts to be retried once the lease runs out. 
+    """
+    with transaction.atomic():
+        alerts = list(AlertOutbox.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            status=AlertOutbox.PENDING,
+            next_attempt_at__lte=timezone.now()
+        ).select_related('patient').order_by('next_attempt_at')[:batch_size])
+
+        lease_until = timezone.now() + ALERT_LEASE
+        for alert in alerts:
+            alert.attempts += 1
+            alert.next_attempt_at = lease_until
+        AlertOutbox.objects.bulk_update(alerts, ['attempts', 'next_attempt_at'])
+    return alerts
+
+
+def deliver_pending_alerts(batch_size=50):
+    """
+    Deliver the outbox alerts that are due. The alerts are claimed in one short transaction (see 
+    claim_due_alerts), sent with no transaction or row lock held, and their results recorded in a 
+    second one, so a slow SMTP or Twilio call never keeps locks open. Each provider gets one digest 
+    for all of their patients' alerts in the batch. The emails of the whole batch go out over one 
+    SMTP connection, then the texts are sent concurrently. An alert whose digest failed for any of its providers is retried with 
+    exponential backoff, up to MAX_ALERT_ATTEMPTS times, for just the providers it has not reached 
+    yet (see AlertOutbox.sent_to). Returns (sent, failed). 
+    """
+    alerts = claim_due_alerts(batch_size)
+    if not alerts:
+        return 0, 0
+
+    providers_by_patient = get_alert_providers({alert.patient_id for alert in alerts})
+    digests = {}
+    for alert in alerts:
+        for provider in providers_by_patient.get(alert.patient_id, []):
+            if provider.id not in alert.sent_to: # sent on an earlier attempt 
+                digests.setdefault(provider.id, (provider, []))[1].append(alert)
+
+    errors = {}
+    texts = []
+    connection = get_connection()
+    try:
+        for provider, provider_alerts in digests.values():
+            try:
+                send_alert_digest(provider, provider_alerts, connection, texts)
+            except Exception as e:
+                print(f"Failed to deliver alerts to provider {provider.id}: {str(e)}")
+                connection.close() # start the next digest on a fresh connection
+                for alert in provider_alerts:
+                    errors[alert.id] = str(e)
+                continue
+            for alert in provider_alerts:
+                alert.sent_to.append(provider.id)
+    finally:
+        connection.close()
+    # All of the batch's texts at once, from send_texts' thread pool. Failed texts are only logged, 
+    # so they don't make the email go out again on retry 
+    send_texts(texts)
+
+    sent = failed = 0
+    for alert in alerts:
+        if alert.id not in errors:
+            alert.status = AlertOutbox.SENT
+            alert.sent_at = timezone.now()
+            sent += 1
+        else:
+            alert.last_error = errors[alert.id]
+            if alert.attempts >= MAX_ALERT_ATTEMPTS:
+                alert.status = AlertOutbox.FAILED
+            else:
+                alert.next_attempt_at = timezone.now() + timedelta(minutes=2 ** alert.attempts)
+            failed += 1
+    with transaction.atomic():
+        AlertOutbox.objects.bulk_update(alerts, ['status', 'sent_at', 'last_error', 'next_attempt_at', 'sent_to'])
+    return sent, failed
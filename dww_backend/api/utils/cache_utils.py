@@ -0,0 +1,98 @@
+import threading
+import time
+from django.core.cache import cache, caches
+from api.models import TreatmentRelationship
+
+def get_version(scope, key):
+    """
+    Current version number of a cached resource. Bumping the version makes every cache entry keyed 
+    on the old one unreachable, which is how invalidation works across all server processes. If the 
+    counter itself has been evicted it restarts from the current time, so it can never go back to 
+    a version that was handed out before. 
+    """
+    version_key = f"version:{scope}:{key}"
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key, 0)
+    return version
+
+
+def bump_version(scope, key):
+    version_key = f"version:{scope}:{key}"
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, time.time_ns(), timeout=None)
+
+
+def bump_versions(scope, keys):
+    """
+    Bump the versions of several resources in one cache round trip. Dropping a counter has the same 
+    effect as incrementing it, since get_version restarts it from the current time. 
+    """
+    cache.delete_many([f"version:{scope}:{key}" for key in keys])
+
+
+# Hit/miss counts are buffered per process and added to the shared counters in batches, so that 
+# counting doesn't cost more cache round trips than the cache hit saves. 
+STATS_FLUSH_INTERVAL = 60  # seconds 
+_pending_stats = {}
+_pending_stats_lock = threading.Lock()
+_last_stats_flush = time.monotonic()
+
+
+def record_cache_event(scope, hit):
+    global _last_stats_flush
+    stat_key = f"stats:{scope}:{'hits' if hit else 'misses'}"
+    with _pending_stats_lock:
+        _pending_stats[stat_key] = _pending_stats.get(stat_key, 0) + 1
+        if time.monotonic() - _last_stats_flush < STATS_FLUSH_INTERVAL:
+            return
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+        _last_stats_flush = time.monotonic()
+
+    for stat_key, count in pending.items():
+        try:
+            cache.incr(stat_key, count)
+        except ValueError:
+            cache.add(stat_key, count, timeout=None)
+
+
+def get_cache_stats(scope):
+    hits = cache.get(f"stats:{scope}:hits", 0)
+    misses = cache.get(f"stats:{scope}:misses", 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
+
+
+def get_cached_dashboard(provider_id, version, build):
+    """
+    The provider's dashboard for the given version, from the in-process dashboard cache, or built 
+    with build() and cached on a miss. Hits and misses are counted for `manage.py cache_stats`. 
+    """
+    dashboard_cache = caches['dashboard']
+    key = f"dashboard:{provider_id}:{version}"
+    dashboard = dashboard_cache.get(key)
+    record_cache_event('dashboard', hit=dashboard is not None)
+    if dashboard is None:
+        dashboard = build()
+        dashboard_cache.set(key, dashboard)
+    return dashboard
+
+
+def invalidate_provider_dashboard(provider_id):
+    bump_version('dashboard', provider_id)
+
+
+def invalidate_patient_dashboards(patient_id):
+    """
+    Invalidate the dashboard of every provider the patient is in a treatment relationship with.
+    """
+    provider_ids = TreatmentRelationship.objects.filter(patient_id=patient_id).values_list('provider_id', flat=True)
+    bump_versions('dashboard', provider_ids)
@@ -0,0 +1,52 @@
+import hashlib
+from api.models import WeightSummary
+from api.utils.cache_utils import get_version
+
+"""
+ETag functions for Django's `condition` decorator. Each one derives a cheap version key for the 
+resource, so unchanged resources are answered with 304 Not Modified before the view runs any of 
+its queries. The version counters are bumped by the handlers in api/signals.py. 
+"""
+
+
+def make_etag(*parts):
+    """
+    Build an ETag from the given version parts. Anything that changes the response body (including 
+    the query string) should be one of the parts. 
+    """
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def weight_history_etag(request, *args, **kwargs):
+    """
+    ETag for a patient's own weight history. The patient's WeightSummary row is rewritten whenever 
+    one of their weight records is added, so its latest timestamp, record count and update time 
+    identify the current version of the history with a single primary key lookup. 
+    """
+    version = WeightSummary.objects.filter(patient_id=request.user.id).values_list(
+        'latest_timestamp', 'record_count', 'last_updated'
+    ).first()
+    return make_etag('weight-history', request.user.id, version, request.GET.urlencode())
+
+
+def dashboard_etag(request, *args, **kwargs):
+    """
+    ETag for a provider's dashboard. The version is kept on the request so the view can look up 
+    the cached dashboard without reading the counter again. 
+    """
+    request.dashboard_version = get_version('dashboard', request.user.id)
+    return make_etag('dashboard', request.user.id, request.dashboard_version)
+
+
+def patient_data_etag(request, *args, **kwargs):
+    patient_id = request.GET.get('id')
+    return make_etag('patient-data', patient_id, get_version('patient_data', patient_id), request.GET.urlencode())
+
+
+def profile_etag(request, *args, **kwargs):
+    return make_etag('profile', request.user.id, get_version('profile', request.user.id))
+
+
+def notifications_etag(request, *args, **kwargs):
+    # Shared by the notification feed and the unread count, so the path is part of it 
+    return make_etag('notifications', request.user.id, get_version('notifications', request.user.id), request.path, request.GET.urlencode())
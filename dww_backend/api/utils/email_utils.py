@@ -1,13 +1,69 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
 from django.template.loader import render_to_string
-from api.models import User, PatientReminder, NotificationPreference
-from datetime import datetime, time
-import pytz
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from queue import Queue, Empty
+import time
+from api.models import User, PatientReminder, ReminderDelivery
+from api.utils.rate_limit import TokenBucket
+from api.utils.reminder_schedule import next_fire_time
 
-def send_reminder_email(user: User, reminder: PatientReminder):
+REMINDER_GRACE_PERIOD = timedelta(hours=1)
+REMINDER_BATCH_SIZE = 500
+REMINDER_MAX_WORKERS = 4  # each worker has its own SMTP connection 
+REMINDER_TICK_BUDGET = timedelta(seconds=60)  # a tick that runs longer overruns into the next minute's reminders 
+REMINDER_DELIVERY_LEASE = timedelta(minutes=10)  # a claimed reminder still pending after this was lost by its node 
+
+_reminder_rate_limiter = TokenBucket(settings.EMAIL_RATE_PER_SECOND)
+
+def html_email(subject, html_message, recipient_list):
+    """
+    An HTML email from the site address, the same as send_mail(subject, '', ..., html_message=...) 
+    would send, to be sent with send_emails. 
+    """
+    message = EmailMultiAlternatives(subject, '', settings.EMAIL_HOST_USER, recipient_list)
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+def send_emails(messages, connection=None, fail_silently=False):
+    """
+    Send `messages` over one SMTP connection instead of opening (and TLS-negotiating) a new one per 
+    message like send_mail does. A `connection` from get_connection() can be passed in to share it 
+    across several calls; it is then left open for the caller to close. 
+
+    Without fail_silently the first failure is raised. With it, failures are logged and the 
+    connection is re-opened for the remaining messages. Returns the number of messages sent. 
+    """
+    messages = [message for message in messages if message.recipients()]
+    if not messages:
+        return 0
+
+    owns_connection = connection is None
+    if owns_connection:
+        connection = get_connection()
+    sent = 0
+    try:
+        for message in messages:
+            try:
+                connection.open() # no-op while the connection is already open
+                sent += connection.send_messages([message]) or 0
+            except Exception as e:
+                if not fail_silently:
+                    raise
+                print(f"Failed to send email to {', '.join(message.recipients())}: {str(e)}")
+                connection.close()
+    finally:
+        if owns_connection:
+            connection.close()
+    return sent
+
+def reminder_email(user: User, reminder: PatientReminder):
     """
-    Send a reminder email to a user for their scheduled reminder.
+    The reminder email for a user's scheduled reminder.
     """
     subject = 'Dry Weight Watchers Reminder'
     
@@ -25,7 +81,7 @@ def send_reminder_email(user: User, reminder: PatientReminder):
           <tr>
             <td style="text-align: center; padding: 20px;">
               <p style="color: #666; font-size: 16px;">Scheduled for: {reminder.time}</p>
-              <p style="color: #666; font-size: 16px;">Days: {reminder.days}</p>
+              <p style="color: #666; font-size: 16px;">Days: {PatientReminder.mask_to_days(reminder.days)}</p>
             </td>
           </tr>
           <tr>
@@ -38,46 +94,190 @@ def send_reminder_email(user: User, reminder: PatientReminder):
     </html>
     """
 
-    from_email = settings.EMAIL_HOST_USER
-    recipient_list = [user.email]
+    return html_email(subject, html_message, [user.email])
+
+def claim_due_reminders(now, batch_size=REMINDER_BATCH_SIZE):
+    """
+    Claim up to `batch_size` due reminders in one transaction: lock them with SELECT ... FOR UPDATE 
+    SKIP LOCKED (so schedulers on other nodes take different ones), move them on to their next fire 
+    time and record a pending ReminderDelivery for each one to email. The unique (reminder, fire_at) 
+    ledger row is what guarantees an occurrence is claimed only once across all nodes. 
+
+    Returns the number of due reminders claimed, the [(delivery, reminder)] to send and the number 
+    skipped for being more than REMINDER_GRACE_PERIOD late. 
+    """
+    with transaction.atomic():
+        due_reminders = list(PatientReminder.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            next_fire_at__lte=now
+        ).select_related('patient', 'patient__notification_preference').order_by('next_fire_at')[:batch_size])
+
+        to_send = []
+        skipped = 0
+        for reminder in due_reminders:
+            preference = getattr(reminder.patient, 'notification_preference', None)
+            if now - reminder.next_fire_at > REMINDER_GRACE_PERIOD:
+                skipped += 1
+            elif preference and preference.email_notifications:
+                to_send.append(ReminderDelivery(reminder=reminder, fire_at=reminder.next_fire_at))
+            reminder.next_fire_at = next_fire_time(reminder, now)
+        PatientReminder.objects.bulk_update(due_reminders, ['next_fire_at'])
+
+        # MySQL doesn't return the ids of bulk inserted rows, so read the new ledger rows back 
+        ReminderDelivery.objects.bulk_create(to_send, ignore_conflicts=True)
+        reminders = {reminder.id: reminder for reminder in due_reminders}
+        fire_times = {(delivery.reminder_id, delivery.fire_at) for delivery in to_send}
+        deliveries = [
+            (delivery, reminders[delivery.reminder_id])
+            for delivery in ReminderDelivery.objects.filter(reminder_id__in=reminders, status=ReminderDelivery.PENDING)
+            if (delivery.reminder_id, delivery.fire_at) in fire_times
+        ]
+    return len(due_reminders), deliveries, skipped
+
+
+def reclaim_stale_deliveries(now, batch_size=REMINDER_BATCH_SIZE):
+    """
+    Claim up to `batch_size` reminder emails that another node claimed more than 
+    REMINDER_DELIVERY_LEASE ago but never marked sent or failed (it died mid-tick), so they are 
+    still sent. The ledger rows are locked with SELECT ... FOR UPDATE SKIP LOCKED and their lease 
+    renewed, so only one node takes each over. Ones that are now more than REMINDER_GRACE_PERIOD 
+    late are marked failed instead. Returns the [(delivery, reminder)] to send. 
+    """
+    with transaction.atomic():
+        stale = list(ReminderDelivery.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            status=ReminderDelivery.PENDING,
+            claimed_at__lte=now - REMINDER_DELIVERY_LEASE
+        ).select_related('reminder__patient', 'reminder__patient__notification_preference').order_by('claimed_at')[:batch_size])
+
+        expired = [delivery.id for delivery in stale if now - delivery.fire_at > REMINDER_GRACE_PERIOD]
+        deliveries = [(delivery, delivery.reminder) for delivery in stale if delivery.id not in expired]
+        ReminderDelivery.objects.filter(id__in=expired).update(status=ReminderDelivery.FAILED)
+        ReminderDelivery.objects.filter(id__in=[delivery.id for delivery, _ in deliveries]).update(claimed_at=now)
+    return deliveries
+
+
+def _percentile(values, percent):
+    """
+    Nearest-rank percentile of `values` (0 if there are none). 
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(int(len(values) * percent / 100 + 0.5) - 1, 0)]
+
 
+def _reminder_sender(queue, results):
+    """
+    Worker of send_reminder_emails: send the queued reminders over its own SMTP connection until 
+    the queue is empty, appending (delivery, sent, send latency) to `results`. 
+    """
+    connection = get_connection()
     try:
-        send_mail(
-            subject,
-            '',
-            from_email,
-            recipient_list,
-            html_message=html_message,
-            fail_silently=False,
-        )
-        print(f"Reminder email sent successfully to {user.email}")
-        return True
-    except Exception as e:
-        print(f"Failed to send reminder email to {user.email}: {str(e)}")
-        return False
-
-def check_and_send_reminder_emails():
-    """
-    Check for reminders that are due and send emails to users who have email notifications enabled.
-    """
-    eastern = pytz.timezone('America/New_York')
-    current_time = datetime.now(eastern)
-    
-    current_hour = current_time.hour
-    current_minute = current_time.minute
-    
-    users_with_email = User.objects.filter(
-        notification_preference__email_notifications=True,
-        patient_reminders__isnull=False
-    ).distinct()
-    
-    for user in users_with_email:
-        # Get user's reminders for current time
-        reminders = PatientReminder.objects.filter(
-            patient=user,
-            time__hour=current_hour,
-            time__minute=current_minute
-        )
-        
-        for reminder in reminders:
-            send_reminder_email(user, reminder) 
\ No newline at end of file
+        while True:
+            try:
+                delivery, reminder = queue.get_nowait()
+            except Empty:
+                return
+            _reminder_rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                send_emails([reminder_email(reminder.patient, reminder)], connection)
+                results.append((delivery, True, time.monotonic() - started))
+            except Exception as e:
+                print(f"Failed to send reminder email to {reminder.patient.email}: {str(e)}")
+                connection.close() # the next reminder opens a fresh one 
+                results.append((delivery, False, time.monotonic() - started))
+    finally:
+        connection.close()
+
+
+def send_reminder_emails(deliveries):
+    """
+    Email the claimed [(delivery, reminder)] from up to REMINDER_MAX_WORKERS threads, throttled to 
+    EMAIL_RATE_PER_SECOND across all of them so a burst of reminders is spread over the minute 
+    instead of tripping the SMTP provider's limits. Returns [(delivery, sent, send latency)]. 
+    """
+    queue = Queue()
+    for delivery in deliveries:
+        queue.put(delivery)
+    results = []
+    workers = min(REMINDER_MAX_WORKERS, len(deliveries))
+    if workers:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(_reminder_sender, queue, results)
+    return results
+
+
+def check_and_send_reminder_emails(now=None):
+    """
+    Send the reminders that are due to users who have email notifications enabled, and move every 
+    due reminder on to its next fire time. Safe to run on several nodes at once, see 
+    claim_due_reminders. Reminders claimed by a node that died before sending them are picked up 
+    again first, see reclaim_stale_deliveries. 
+
+    Reminders missed while no checker was running are still sent if they are less than 
+    REMINDER_GRACE_PERIOD late, and skipped (just rescheduled) otherwise. Returns the tick's stats: 
+    how late the reminders went out, how long each send took and by how many seconds the tick 
+    overran, i.e. ran past REMINDER_TICK_BUDGET or past the time the next reminder was due. 
+    """
+    now = now or timezone.now()
+    started = time.monotonic()
+    due = skipped = sent_count = failed_count = 0
+    lags, latencies = [], []
+
+    def send(deliveries):
+        nonlocal sent_count, failed_count
+        sent_ids, failed_ids = [], []
+        for delivery, sent, latency in send_reminder_emails(deliveries):
+            latencies.append(latency)
+            if sent:
+                sent_ids.append(delivery.id)
+                lags.append((timezone.now() - delivery.fire_at).total_seconds())
+            else:
+                failed_ids.append(delivery.id)
+        # Recorded per batch, well within the lease of the batch's ledger rows 
+        ReminderDelivery.objects.filter(id__in=sent_ids).update(status=ReminderDelivery.SENT, sent_at=timezone.now())
+        ReminderDelivery.objects.filter(id__in=failed_ids).update(status=ReminderDelivery.FAILED)
+        sent_count += len(sent_ids)
+        failed_count += len(failed_ids)
+
+    while True:
+        deliveries = reclaim_stale_deliveries(now)
+        due += len(deliveries)
+        send(deliveries)
+        if len(deliveries) < REMINDER_BATCH_SIZE:
+            break
+    while True:
+        claimed, deliveries, batch_skipped = claim_due_reminders(now)
+        due += claimed
+        skipped += batch_skipped
+        send(deliveries)
+        if claimed < REMINDER_BATCH_SIZE:
+            break
+
+    duration = time.monotonic() - started
+    overrun = duration - REMINDER_TICK_BUDGET.total_seconds()
+    next_due = get_next_reminder_time() if due else None
+    if next_due:
+        overrun = max(overrun, (timezone.now() - next_due).total_seconds())
+    if sent_count or failed_count or skipped:
+        print(f"Sent {sent_count} of {sent_count + failed_count} reminder emails in {duration:.1f}s, skipped {skipped} missed by more than {REMINDER_GRACE_PERIOD}")
+    return {
+        'due': due,
+        'sent': sent_count,
+        'failed': failed_count,
+        'skipped': skipped,
+        'max_lag': max(lags, default=0),
+        'avg_lag': sum(lags) / len(lags) if lags else 0,
+        'p50_latency': _percentile(latencies, 50),
+        'p99_latency': _percentile(latencies, 99),
+        'duration': duration,
+        'overrun': max(overrun, 0),
+    }
+
+
+def get_next_reminder_time():
+    """
+    When the earliest reminder is due (None if there are no reminders), from the next_fire_at index. 
+    """
+    return PatientReminder.objects.aggregate(next_fire_at=Min('next_fire_at'))['next_fire_at']
@@ -0,0 +1,83 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from api.models import User, WeightRecord, PatientNote
+
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_COLUMNS = [
+    'record_type', 'patient_id', 'id', 'timestamp', 'weight', 'note',
+    'first_name', 'last_name', 'email', 'height', 'date_of_birth', 'sex',
+    'medications', 'other_info', 'alarm_threshold', 'last_updated',
+]
+
+
+def iter_in_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield `queryset.values(*fields)` rows ordered by (patient_id, id), fetching `chunk_size` rows
+    at a time with keyset pagination. MySQLdb buffers a whole result set client-side even with
+    .iterator(), so chunking on the key is what keeps memory flat for arbitrarily large panels.
+    """
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(Q(patient_id__gt=last[0]) | Q(patient_id=last[0], id__gt=last[1]))
+        rows = list(chunk.order_by('patient_id', 'id').values(*fields)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1]['patient_id'], rows[-1]['id'])
+
+
+def iter_panel_rows(provider):
+    """
+    Every patient of the provider (with their PatientInfo), then all of their weight records, then
+    all of their notes, as flat dicts tagged with a `record_type`.
+    """
+    patient_ids = provider.treatment_providers.values('patient_id')
+
+    patients = User.objects.filter(id__in=patient_ids, role=User.PATIENT).annotate(
+        patient_id=F('id'),
+        height=F('patient_info__height'),
+        date_of_birth=F('patient_info__date_of_birth'),
+        sex=F('patient_info__sex'),
+        medications=F('patient_info__medications'),
+        other_info=F('patient_info__other_info'),
+        alarm_threshold=F('patient_info__alarm_threshold'),
+        last_updated=F('patient_info__last_updated'),
+    )
+    for row in iter_in_chunks(patients, [
+        'patient_id', 'id', 'first_name', 'last_name', 'email', 'height', 'date_of_birth', 'sex',
+        'medications', 'other_info', 'alarm_threshold', 'last_updated',
+    ]):
+        yield {'record_type': 'patient', **row}
+
+    weights = WeightRecord.objects.filter(patient_id__in=patient_ids)
+    for row in iter_in_chunks(weights, ['patient_id', 'id', 'timestamp', 'weight']):
+        yield {'record_type': 'weight', **row}
+
+    notes = PatientNote.objects.filter(patient_id__in=patient_ids)
+    for row in iter_in_chunks(notes, ['patient_id', 'id', 'timestamp', 'note']):
+        yield {'record_type': 'note', **row}
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """
+    File-like object that hands back whatever csv.writer writes to it, so rows can be streamed.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=CSV_COLUMNS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
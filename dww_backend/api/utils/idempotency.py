@@ -0,0 +1,117 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from api.models import IdempotencyKey
+
+"""
+Idempotency-Key support for write endpoints the mobile app may retry. The first request with a key
+runs the view and stores its response; a retry with the same key gets the stored response back
+without running the view again (so nothing is written twice and no second alert goes out). The
+lookup is a single query on the (user, key) unique index.
+"""
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = timedelta(minutes=2)  # far longer than gunicorn lets a request run (30s) 
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _response_body(response):
+    if hasattr(response, 'data'):  # rest_framework Response, not rendered yet
+        return response.data
+    return json.loads(response.content) if response.content else None
+
+
+def _claim_key(request, key, request_hash):
+    """
+    Get or create the IdempotencyKey row for this request. Returns (row, created). An expired row
+    is taken over as if it were new, and so is a row for this same request that is still marked
+    in flight after IDEMPOTENCY_IN_FLIGHT_TIMEOUT: the process handling it died before storing its
+    response, and the client's retry would otherwise get 409s until the key expired.
+    """
+    try:
+        with transaction.atomic():
+            record, created = IdempotencyKey.objects.get_or_create(
+                user=request.user,
+                key=key,
+                defaults={'endpoint': request.path, 'request_hash': request_hash}
+            )
+    except IntegrityError:  # a concurrent request with the same key created it first
+        return IdempotencyKey.objects.get(user=request.user, key=key), False
+    if created:
+        return record, True
+
+    now = timezone.now()
+    expired = record.created_at < now - IDEMPOTENCY_KEY_TTL
+    abandoned = (
+        record.status_code is None and record.created_at < now - IDEMPOTENCY_IN_FLIGHT_TIMEOUT
+        and record.endpoint == request.path and record.request_hash == request_hash
+    )
+    if not (expired or abandoned):
+        return record, False
+
+    # Conditional on created_at, so only one of several concurrent retries takes the row over
+    taken_over = IdempotencyKey.objects.filter(id=record.id, created_at=record.created_at).update(
+        endpoint=request.path, request_hash=request_hash, status_code=None, response_body=None, created_at=now
+    )
+    record.refresh_from_db()
+    return record, bool(taken_over)
+
+
+def idempotent(view):
+    """
+    Make a view honour the `Idempotency-Key` request header. Goes below the rest_framework decorators,
+    so that the user is already authenticated. Requests without the header are not affected.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return JsonResponse({'error': f'Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters'}, status=400)
+
+        request_hash = _request_hash(request)
+        record, created = _claim_key(request, key, request_hash)
+        if not created:
+            if record.endpoint != request.path or record.request_hash != request_hash:
+                return JsonResponse({'error': 'Idempotency-Key was already used for a different request'}, status=422)
+            if record.status_code is None:
+                return JsonResponse({'error': 'A request with this Idempotency-Key is still being processed'}, status=409)
+            response = JsonResponse(record.response_body, status=record.status_code, safe=False)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            # Failed requests are not remembered, so the client can retry them with the same key
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response_body = _response_body(response)
+            record.save(update_fields=['status_code', 'response_body'])
+        return response
+
+    return wrapper
+
+
+def purge_expired_idempotency_keys():
+    """
+    Delete the keys older than IDEMPOTENCY_KEY_TTL. Returns the number deleted.
+    """
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - IDEMPOTENCY_KEY_TTL).delete()
+    return deleted
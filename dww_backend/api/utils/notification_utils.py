@@ -0,0 +1,62 @@
+from django.db.models import Q
+from api.models import ProviderNotification
+from api.utils.cache_utils import bump_version
+from api.utils.weight_history import encode_cursor, decode_cursor, parse_page_size
+
+DEFAULT_NOTIFICATION_PAGE_SIZE = 50
+
+
+def notification_page_query(provider, params):
+    """
+    The query behind get_notification_page (also EXPLAINed by check_query_plans): one more row 
+    than the page size. Returns the queryset and the page size. 
+    """
+    notifications = ProviderNotification.objects.filter(provider=provider)
+    if params.get('unread') == 'true':
+        notifications = notifications.filter(is_read=False)
+    limit = parse_page_size(params.get('limit'), default=DEFAULT_NOTIFICATION_PAGE_SIZE)
+
+    cursor = params.get('cursor')
+    if cursor:
+        before_created_at, before_id = decode_cursor(cursor)
+        notifications = notifications.filter(
+            Q(created_at__lt=before_created_at) | Q(created_at=before_created_at, id__lt=before_id)
+        )
+
+    return notifications.order_by('-created_at', '-id').values('id', 'message', 'created_at', 'is_read', 'patient_id')[:limit + 1], limit
+
+
+def get_notification_page(provider, params):
+    """
+    One page of the provider's notifications, newest first, using keyset pagination on 
+    (created_at, id) so that every page costs the same however long the feed is. `unread=true` 
+    only returns unread notifications. Returns the rows and the cursor for the next page (None on 
+    the last page). Raises ValueError for malformed parameters. 
+    """
+    # Fetch one extra row to find out whether there is another page
+    query, limit = notification_page_query(provider, params)
+    rows = list(query)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def get_unread_count(provider):
+    return ProviderNotification.objects.filter(provider=provider, is_read=False).count()
+
+
+def mark_notifications_read(provider, ids=None):
+    """
+    Mark the provider's notifications with the given ids (or all of them if `ids` is None) as read, 
+    in a single UPDATE. Ids of other providers' notifications are ignored. Returns the number of 
+    notifications that were unread. 
+    """
+    notifications = ProviderNotification.objects.filter(provider=provider, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    updated = notifications.update(is_read=True)
+    if updated:
+        bump_version('notifications', provider.id) # update() doesn't send post_save
+    return updated
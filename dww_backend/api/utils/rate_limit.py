@@ -0,0 +1,42 @@
+import threading
+import time
+
+"""
+Rate limiting for outgoing messages (SMS, and anything else a provider caps per second). 
+"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: tokens are added at `rate` per second, up to `capacity` (the largest
+    burst allowed, defaults to one second's worth). acquire() takes a token, waiting for one if the
+    bucket is empty, so callers sharing a bucket never go over the rate together.
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, block=True):
+        """
+        Take one token. Returns False instead of waiting if `block` is False and none is available.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if not block:
+                return False
+            time.sleep(wait)
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from django.utils import timezone
+from api.models import PatientReminder
+import pytz
+
+"""
+When reminders fire. Each PatientReminder stores its next fire time in UTC (`next_fire_at`, indexed), 
+so finding the due reminders is a single range query however many reminders there are, and a 
+reminder that has fired is moved on to its next occurrence. 
+"""
+
+
+def next_fire_time(reminder, after):
+    """
+    The first time after `after` (an aware datetime) at which the reminder is due, in UTC. Reminder 
+    times are wall clock times in the patient's time zone and fire at the start of their minute, 
+    only on the weekdays in the reminder's `days` mask (None if the mask is empty). 
+    Across DST changes, a time skipped by the clocks going forward fires an hour later (e.g. 2:30 
+    fires at 3:30) and a time that happens twice fires once, on the second occurrence. 
+    """
+    zone = pytz.timezone(reminder.patient.time_zone)
+    fire_time = reminder.time.replace(second=0, microsecond=0)
+    day = after.astimezone(zone).date()
+    for offset in range(8):
+        candidate_day = day + timedelta(days=offset)
+        if not reminder.fires_on(candidate_day):
+            continue
+        candidate = zone.localize(datetime.combine(candidate_day, fire_time), is_dst=False)
+        if candidate > after:
+            return candidate.astimezone(pytz.utc)
+    return None
+
+
+def reschedule_patient_reminders(patient):
+    """
+    Recompute the next fire times of the patient's reminders, e.g. after their time zone changed. 
+    """
+    reminders = list(PatientReminder.objects.filter(patient=patient))
+    now = timezone.now()
+    for reminder in reminders:
+        reminder.patient = patient
+        reminder.next_fire_at = next_fire_time(reminder, now)
+    PatientReminder.objects.bulk_update(reminders, ['next_fire_at'])
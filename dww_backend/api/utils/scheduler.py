@@ -1,68 +1,128 @@
-from django.core.management import call_command
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+from api.utils.alert_utils import deliver_pending_alerts
+from api.utils.email_utils import check_and_send_reminder_emails, get_next_reminder_time
+from api.utils.idempotency import purge_expired_idempotency_keys
+import heapq
+import itertools
 import threading
-import time
-import os
-import sys
-import atexit
-
-if sys.platform == "win32":
-    import msvcrt
-else:
-    import fcntl
-
-# Global flag to track if scheduler is running
-_scheduler_running = False
-_lock_file = None
-
-def cleanup():
-    """Cleanup function to release the lock file when the process exits"""
-    global _lock_file
-    if _lock_file:
-        try:
-            if sys.platform == "win32":
-                pass  # unlocking is not needed with msvcrt, just close the file
-            else:
-                fcntl.flock(_lock_file, fcntl.LOCK_UN)
-        finally:
-            _lock_file.close()
-            _lock_file = None
-
-def acquire_lock():
-    """Try to acquire a lock file to ensure only one scheduler runs"""
-    global _lock_file
-    lock_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'scheduler.lock')
-    _lock_file = open(lock_file_path, 'w')
-    try:
-        if sys.platform == "win32":
-            msvcrt.locking(_lock_file.fileno(), msvcrt.LK_NBLCK, 1)
-        else:
-            fcntl.flock(_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        atexit.register(cleanup)
-        return True
-    except (IOError, OSError):
-        _lock_file.close()
-        _lock_file = None
-        return False
-
-def run_reminder_checker():
+
+
+class Scheduler:
     """
-    Run the reminder checker every minute
+    Runs jobs at the times they ask for. Jobs wait in a heap ordered by their next run time and the 
+    thread sleeps until the earliest one is due, so runs don't drift by their own duration the way a 
+    fixed sleep after each run does. A job is a function that takes the time it was due and returns 
+    the time it wants to run next. 
+
+    For each job the scheduler keeps its lag (how late it started) and duration, which are also 
+    published to the cache for `manage.py scheduler_stats`. 
     """
-    global _scheduler_running
-    _scheduler_running = True
-    
-    while _scheduler_running:
+    RETRY_DELAY = timedelta(seconds=60)  # after a job raised 
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()  # tie-breaker, so jobs themselves are never compared 
+        self._stop = threading.Event()
+        self.stats = {}
+
+    def add_job(self, name, func, run_at=None):
+        heapq.heappush(self._heap, (run_at or timezone.now(), next(self._counter), name, func))
+        self.stats.setdefault(name, {'runs': 0, 'errors': 0, 'last_lag': 0, 'max_lag': 0, 'last_duration': 0})
+
+    def run_pending(self):
+        """
+        Run every job that is due. Returns the number of seconds until the next one is. 
+        """
+        while self._heap and self._heap[0][0] <= timezone.now():
+            due_at, _, name, func = heapq.heappop(self._heap)
+            started = timezone.now()
+            stats = self.stats[name]
+            stats['last_lag'] = (started - due_at).total_seconds()
+            stats['max_lag'] = max(stats['max_lag'], stats['last_lag'])
+            # Outside the request cycle nothing else drops a connection the database has closed (e.g. 
+            # after a MySQL restart or failover), so do what Django does around each request 
+            close_old_connections()
+            try:
+                next_run = func(due_at)
+            except Exception as e:
+                print(f"Error in scheduled job {name}: {str(e)}")
+                stats['errors'] += 1
+                next_run = started + self.RETRY_DELAY
+            close_old_connections()
+            stats['runs'] += 1
+            stats['last_duration'] = (timezone.now() - started).total_seconds()
+            heapq.heappush(self._heap, (next_run, next(self._counter), name, func))
+            self.publish_stats()
+
+        if not self._heap:
+            return None
+        return max((self._heap[0][0] - timezone.now()).total_seconds(), 0)
+
+    def publish_stats(self):
         try:
-            call_command('check_reminders')
+            cache.set('scheduler:stats', {'updated': timezone.now().isoformat(), 'jobs': self.stats}, timeout=None)
         except Exception as e:
-            print(f"Error in reminder scheduler: {str(e)}")
-        time.sleep(60)  # Check every minute
+            print(f"Could not publish scheduler stats: {str(e)}")
+
+    def run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.run_pending())
+
+    def stop(self):
+        self._stop.set()
+
+
+REMINDER_POLL_INTERVAL = timedelta(seconds=30)  # how soon a new or edited reminder is noticed 
+
+
+def run_due_reminders(due_at):
+    """
+    Scheduler job: send the due reminders, then sleep until the next one is due (but no longer than 
+    REMINDER_POLL_INTERVAL, since reminders can be added or edited by other processes meanwhile). 
+    """
+    reminder_stats = check_and_send_reminder_emails()
+    if reminder_stats['due']:
+        cache.set('scheduler:reminders', {**reminder_stats, 'at': timezone.now().isoformat()}, timeout=None)
+
+    next_run = timezone.now() + REMINDER_POLL_INTERVAL
+    next_reminder = get_next_reminder_time()
+    if next_reminder:
+        next_run = min(next_run, next_reminder)
+    return next_run
+
+
+ALERT_POLL_INTERVAL = timedelta(seconds=10)
+IDEMPOTENCY_PURGE_INTERVAL = timedelta(hours=1)
+
+
+def deliver_due_alerts(due_at):
+    """
+    Scheduler job: send the weight change alerts waiting in the outbox. 
+    """
+    sent, failed = deliver_pending_alerts()
+    if sent or failed:
+        print(f"Delivered {sent} alerts, {failed} failed")
+    return timezone.now() + ALERT_POLL_INTERVAL
+
+
+def purge_idempotency_keys(due_at):
+    """
+    Scheduler job: delete the stored Idempotency-Key responses that are past their TTL. 
+    """
+    purge_expired_idempotency_keys()
+    return timezone.now() + IDEMPOTENCY_PURGE_INTERVAL
+
 
-def start_reminder_scheduler():
+def build_scheduler():
     """
-    Start the reminder scheduler in a separate thread
+    Scheduler with all of the app's periodic work, run by `manage.py run_scheduler`. Every job 
+    claims its work in the database, so running more than one scheduler process is safe. 
     """
-    global _scheduler_running
-    if not _scheduler_running and acquire_lock():
-        thread = threading.Thread(target=run_reminder_checker, daemon=True)
-        thread.start() 
\ No newline at end of file
+    scheduler = Scheduler()
+    scheduler.add_job('reminders', run_due_reminders)
+    scheduler.add_job('alerts', deliver_due_alerts)
+    scheduler.add_job('idempotency_keys', purge_idempotency_keys)
+    return scheduler
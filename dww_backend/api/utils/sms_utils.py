@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+from api.utils.rate_limit import TokenBucket
+
+"""
+Outgoing SMS. One Twilio client (and so one pool of HTTPS connections) is shared by the whole 
+process, and a batch of texts is sent from a small thread pool instead of one after the other, 
+throttled to SMS_RATE_PER_SECOND across all threads. 
+"""
+
+SMS_MAX_WORKERS = 8
+
+_client = None
+_client_lock = threading.Lock()
+_rate_limiter = TokenBucket(settings.SMS_RATE_PER_SECOND)
+
+
+def get_twilio_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client(
+                settings.TWILIO_SID, settings.TWILIO_TOKEN,
+                http_client=TwilioHttpClient(timeout=settings.TWILIO_TIMEOUT) # the default never times out 
+            )
+            if settings.TWILIO_API_URL:
+                _client.api.base_url = settings.TWILIO_API_URL.rstrip('/') # e.g. the fake_twilio command
+        return _client
+
+
+def _send_one(client, phone, body):
+    _rate_limiter.acquire()
+    try:
+        client.messages.create(
+            body=body,
+            from_=settings.TWILIO_PHONE,
+            to=str(phone) # PhoneNumber objects are not accepted by the Twilio client 
+        )
+        return True
+    except Exception as e:
+        print(f"Failed to send SMS to {phone}: {str(e)}")
+        return False
+
+
+def send_sms(phones, body):
+    """
+    Text `body` to each number in `phones`. A failed text is logged and does not stop the others.
+    Returns the number sent.
+    """
+    return send_texts([(phone, body) for phone in phones])
+
+
+def send_texts(messages):
+    """
+    Send each (phone, body) in `messages`, like send_sms but with a different text per number.
+    Returns the number sent.
+    """
+    messages = [(phone, body) for phone, body in messages if phone]
+    if not messages:
+        return 0
+    client = get_twilio_client()
+    if len(messages) == 1:
+        return int(_send_one(client, *messages[0]))
+    with ThreadPoolExecutor(max_workers=min(SMS_MAX_WORKERS, len(messages))) as executor:
+        return sum(executor.map(lambda message: _send_one(client, *message), messages))
@@ -0,0 +1,216 @@
+import base64
+from datetime import datetime, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from decimal import Decimal
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from api.models import WeightRecord
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+DEFAULT_MAX_POINTS = 500
+BUCKET_RESOLUTIONS = {
+    'daily': TruncDay,
+    'weekly': TruncWeek,
+}
+
+
+def encode_cursor(timestamp, record_id):
+    raw = f"{timestamp.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_bound(value, name):
+    """
+    Parse a `since`/`until` query parameter, which may be a full ISO datetime or just a date.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid '{name}', expected an ISO date or datetime")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_page_size(value, name='limit', default=DEFAULT_PAGE_SIZE):
+    if not value:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}', expected a number")
+    if limit <= 0:
+        raise ValueError(f"Invalid '{name}', must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def filter_weight_history(patient_id, params):
+    """
+    A patient's weight records restricted to the optional `since`/`until` range in `params`. 
+    `since_id` only keeps records created after the record with that id (ids only ever increase), 
+    which lets a client that already has the history fetch just the new rows. 
+    """
+    records = WeightRecord.objects.filter(patient_id=patient_id)
+    since_id = params.get('since_id')
+    if since_id:
+        try:
+            records = records.filter(id__gt=int(since_id))
+        except ValueError:
+            raise ValueError("Invalid 'since_id', expected a number")
+    since = parse_bound(params.get('since'), 'since')
+    until = parse_bound(params.get('until'), 'until')
+    if since:
+        records = records.filter(timestamp__gte=since)
+    if until:
+        records = records.filter(timestamp__lt=until)
+    return records
+
+
+def weight_history_page_query(patient_id, params):
+    """
+    The query behind get_weight_history_page (also EXPLAINed by check_query_plans): one more row 
+    than the page size, so the caller can tell whether there is another page. Returns the queryset 
+    and the page size. 
+    """
+    records = filter_weight_history(patient_id, params)
+    limit = parse_page_size(params.get('limit'))
+
+    cursor = params.get('cursor')
+    if cursor:
+        after_timestamp, after_id = decode_cursor(cursor)
+        records = records.filter(
+            Q(timestamp__gt=after_timestamp) | Q(timestamp=after_timestamp, id__gt=after_id)
+        )
+    return records.order_by('timestamp', 'id').values('id', 'weight', 'timestamp')[:limit + 1], limit
+
+
+def get_weight_history_page(patient_id, params):
+    """
+    One page of a patient's weight history in chronological order, using keyset pagination on
+    (timestamp, id). Returns the rows and the cursor for the next page (None on the last page).
+    Raises ValueError for malformed parameters.
+    """
+    query, limit = weight_history_page_query(patient_id, params)
+    rows = list(query)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def parse_time_zone(value):
+    """
+    Parse the `tz` query parameter (an IANA zone name), defaulting to the server's time zone.
+    """
+    if not value:
+        return timezone.get_current_timezone()
+    try:
+        return ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError("Invalid 'tz', expected an IANA time zone name")
+
+
+def get_bucketed_weight_history(records, trunc, tzinfo=None):
+    """
+    Min/avg/max weight per day or week, aggregated by the database. Days start at midnight in 
+    `tzinfo`, so the buckets match the calendar of the person looking at the chart. 
+    """
+    buckets = records.annotate(bucket=trunc('timestamp', tzinfo=tzinfo)).values('bucket').annotate(
+        min_weight=Min('weight'),
+        avg_weight=Avg('weight'),
+        max_weight=Max('weight'),
+        count=Count('id'),
+    ).order_by('bucket')
+    return [
+        {
+            'timestamp': bucket['bucket'],
+            'min_weight': bucket['min_weight'],
+            'avg_weight': round(Decimal(bucket['avg_weight']), 2),
+            'max_weight': bucket['max_weight'],
+            'count': bucket['count'],
+        }
+        for bucket in buckets
+    ]
+
+
+def largest_triangle_three_buckets(points, max_points):
+    """
+    Downsample (x, y, row) points to at most `max_points` with the Largest-Triangle-Three-Buckets 
+    algorithm, which keeps the visual shape of the series (peaks and dips survive) in O(n). 
+    """
+    if len(points) <= max_points:
+        return [row for _, _, row in points]
+    if max_points < 3:
+        return [row for _, _, row in (points[0], points[-1])[:max_points]]
+
+    sampled = [points[0][2]]
+    bucket_size = (len(points) - 2) / (max_points - 2)
+    previous = points[0]
+    for i in range(max_points - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third corner of the triangle
+        next_start, next_end = end, min(int((i + 2) * bucket_size) + 1, len(points))
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        best, best_area = None, -1
+        for point in points[start:end]:
+            area = abs(
+                (previous[0] - avg_x) * (point[1] - previous[1]) -
+                (previous[0] - point[0]) * (avg_y - previous[1])
+            )
+            if area > best_area:
+                best, best_area = point, area
+        sampled.append(best[2])
+        previous = best
+
+    sampled.append(points[-1][2])
+    return sampled
+
+
+def get_downsampled_weight_history(records, max_points):
+    rows = records.order_by('timestamp', 'id').values('id', 'weight', 'timestamp')
+    points = [(row['timestamp'].timestamp(), float(row['weight']), row) for row in rows.iterator(chunk_size=2000)]
+    return largest_triangle_three_buckets(points, max_points)
+
+
+def get_weight_history(patient_id, params):
+    """
+    Entry point for the weight history endpoints. `resolution` selects what is returned: 
+      - 'raw' (default): paginated records, see get_weight_history_page 
+      - 'daily' / 'weekly': one min/avg/max bucket per day or week, in the `tz` time zone 
+      - 'lttb': at most `max_points` records, chosen to preserve the shape of the chart 
+    The non-raw resolutions honour `since`/`until` but are not paginated. Returns the rows and 
+    the next page cursor (always None for non-raw resolutions). 
+    """
+    resolution = params.get('resolution') or 'raw'
+    if resolution == 'raw':
+        return get_weight_history_page(patient_id, params)
+
+    records = filter_weight_history(patient_id, params)
+    if resolution in BUCKET_RESOLUTIONS:
+        tzinfo = parse_time_zone(params.get('tz'))
+        return get_bucketed_weight_history(records, BUCKET_RESOLUTIONS[resolution], tzinfo), None
+    if resolution == 'lttb':
+        max_points = parse_page_size(params.get('max_points'), 'max_points', DEFAULT_MAX_POINTS)
+        return get_downsampled_weight_history(records, max_points), None
+    raise ValueError(f"Invalid 'resolution', expected one of raw, {', '.join(BUCKET_RESOLUTIONS)}, lttb")
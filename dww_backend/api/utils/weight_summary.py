@@ -0,0 +1,125 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Avg, F
+from django.utils import timezone
+from api.models import TreatmentRelationship, User, WeightRecord, WeightSummary
+from api.utils.alert_rules import AlertRuleEngine, BASELINE_DAYS
+
+SUMMARY_AVERAGE_WINDOW = timedelta(days=7)
+
+
+def start_of_day(timestamp):
+    """
+    Midnight (in the active timezone) of the day the given timestamp falls on.
+    """
+    return timezone.localtime(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def average_window_records(patient_id, latest_timestamp):
+    return WeightRecord.objects.filter(
+        patient_id=patient_id,
+        timestamp__gt=latest_timestamp - SUMMARY_AVERAGE_WINDOW,
+        timestamp__lte=latest_timestamp
+    )
+
+
+def _average_before(patient_id, latest_timestamp):
+    average = average_window_records(patient_id, latest_timestamp).aggregate(average=Avg('weight'))['average']
+    return round(Decimal(average), 2) if average is not None else None
+
+
+def rebuild_alert_state(patient: User, latest_timestamp):
+    """
+    Rebuild the alert rules' state by replaying the records from the days leading up to the latest one.
+    """
+    engine = AlertRuleEngine.for_patient(patient)
+    state = {}
+    records = WeightRecord.objects.filter(
+        patient=patient,
+        timestamp__gt=latest_timestamp - timedelta(days=BASELINE_DAYS + 1),
+        timestamp__lte=latest_timestamp
+    ).order_by('timestamp', 'id').values_list('weight', 'timestamp')
+    for weight, timestamp in records:
+        _, state = engine.evaluate(state, weight, timestamp)
+    return state
+
+
+def rebuild_weight_summary(patient: User):
+    """
+    Recompute a patient's WeightSummary from their raw weight records, creating it if needed.
+    """
+    records = WeightRecord.objects.filter(patient=patient).order_by('-timestamp')
+    latest = records.values('weight', 'timestamp').first()
+    summary_fields = {
+        'latest_weight': None,
+        'latest_timestamp': None,
+        'prev_weight': None,
+        'prev_timestamp': None,
+        'avg_weight_7d': None,
+        'record_count': records.count(),
+        'alert_state': {},
+    }
+    if latest:
+        prev = records.filter(
+            timestamp__lt=start_of_day(latest['timestamp'])
+        ).values('weight', 'timestamp').first()
+        summary_fields.update({
+            'latest_weight': latest['weight'],
+            'latest_timestamp': latest['timestamp'],
+            'prev_weight': prev['weight'] if prev else None,
+            'prev_timestamp': prev['timestamp'] if prev else None,
+            'avg_weight_7d': _average_before(patient.id, latest['timestamp']),
+            'alert_state': rebuild_alert_state(patient, latest['timestamp']),
+        })
+
+    summary, _ = WeightSummary.objects.update_or_create(patient=patient, defaults=summary_fields)
+    return summary
+
+
+def dashboard_patients(provider_id):
+    """
+    The provider dashboard: each patient of the provider with their latest and previous-day weights. 
+    Those come from the per-patient summary table, so the whole dashboard is a single query that 
+    never touches the raw weight history. 
+    """
+    patient_ids = TreatmentRelationship.objects.filter(provider_id=provider_id).values_list('patient_id', flat=True)
+    return User.objects.filter(id__in=patient_ids, role=User.PATIENT).values(
+        'id', 'first_name', 'last_name', 'email',
+        latest_weight=F('weight_summary__latest_weight'),
+        latest_weight_timestamp=F('weight_summary__latest_timestamp'),
+        prev_weight=F('weight_summary__prev_weight'),
+        prev_weight_timestamp=F('weight_summary__prev_timestamp'),
+        alarm_threshold=F('patient_info__alarm_threshold')
+    )
+
+
+def get_locked_weight_summary(patient: User):
+    """
+    Fetch a patient's WeightSummary with a row lock for the rest of the current transaction,
+    building it from their history first if it doesn't exist yet (or predates the alert state).
+    """
+    summary = WeightSummary.objects.select_for_update().filter(patient=patient).first()
+    if summary is None or (summary.record_count and not summary.alert_state):
+        rebuild_weight_summary(patient)
+        summary = WeightSummary.objects.select_for_update().get(patient=patient)
+    return summary
+
+
+def apply_weight_record(summary: WeightSummary, record: WeightRecord):
+    """
+    Incrementally fold a newly created weight record into the patient's summary. Records that are
+    older than the current latest one can't be applied incrementally, so those trigger a rebuild.
+    The alert state is expected to have been advanced already by check_and_notify_weight_change.
+    """
+    if summary.latest_timestamp and record.timestamp < summary.latest_timestamp:
+        return rebuild_weight_summary(summary.patient)
+
+    if summary.latest_timestamp and summary.latest_timestamp < start_of_day(record.timestamp):
+        summary.prev_weight = summary.latest_weight
+        summary.prev_timestamp = summary.latest_timestamp
+    summary.latest_weight = record.weight
+    summary.latest_timestamp = record.timestamp
+    summary.record_count += 1
+    summary.avg_weight_7d = _average_before(summary.patient_id, record.timestamp)
+    summary.save()
+    return summary
@@ -7,6 +7,7 @@ from rest_framework.decorators import api_view, authentication_classes, permissi
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication 
+from api.utils.idempotency import idempotent
 
 """
 Note: All patient-facing APIs should use rest_framework's JWT authentication
@@ -19,7 +20,8 @@ def get_reminders(request):
     try:
         user = request.user
         reminders = PatientReminder.objects.filter(patient=user).values('id', 'time', 'days')
-        return JsonResponse(list(reminders), safe=False, status=201)
+        data = [{**reminder, 'days': PatientReminder.mask_to_days(reminder['days'])} for reminder in reminders]
+        return JsonResponse(data, safe=False, status=201)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -27,6 +29,7 @@ def get_reminders(request):
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@idempotent
 def add_reminder(request):
     try:
         user = request.user
@@ -2,22 +2,34 @@
 from django.http import JsonResponse
 from django.contrib.auth import authenticate, logout, login as django_login
 from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction
+from django.utils import timezone
+from django.views.decorators.http import condition
 from api.models import *
 from api.forms import *
 from api.serializers import *
 import json
+import pytz
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication 
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
-from api.views.shared_views import send_verification_email, check_and_notify_weight_change
+from api.views.shared_views import send_verification_email
+from api.utils.alert_utils import check_and_notify_weight_change
+from api.utils.weight_summary import get_locked_weight_summary, apply_weight_record, rebuild_weight_summary
+from api.utils.weight_history import get_weight_history
+from api.utils.conditional import weight_history_etag
+from api.utils.idempotency import idempotent
+from api.utils.reminder_schedule import reschedule_patient_reminders
 
 """
 Note: All patient-facing APIs should use rest_framework's JWT authentication
 """
 
+MAX_WEIGHT_BATCH_SIZE = 500
+
 
 
 @csrf_exempt
@@ -74,6 +86,7 @@ def get_providers(request):
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@idempotent
 def add_relationship(request): 
     try:
         data = request.data
@@ -111,7 +124,8 @@ def patient_profile_data(request):
         'lastname': user.last_name,
         'email': user.email,
         'phone': str(user.phone),
-        'unit_preference': user.unit_preference
+        'unit_preference': user.unit_preference,
+        'timezone': user.time_zone
     })
 
 
@@ -144,17 +158,28 @@ def patient_change_password(request):
 @api_view(['GET'])   
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=weight_history_etag)
 def get_weight_record(request):
+    """
+    Returns the patient's weight history oldest first, one page at a time. Optional query 
+    parameters: `since`/`until` (ISO date or datetime), `since_id` (only records newer than that 
+    one), `limit` (page size) and `cursor`. When there are more records, the cursor for the next 
+    page is sent in the X-Next-Cursor header. `resolution` (daily, weekly or lttb) returns a 
+    downsampled series for charts instead, with days and weeks starting in the `tz` time zone. 
+    Responses carry an ETag, and a request with a matching If-None-Match gets a 304 without the 
+    history being queried. 
+    """
     try:
         user = request.user
         try:
-            weight_history = list(WeightRecord.objects.filter(
-                patient=user
-                ).order_by('timestamp').values('weight', 'timestamp'))
-        except WeightRecord.DoesNotExist:
-            return JsonResponse({'error': 'Record not found'}, status=404)
+            weight_history, next_cursor = get_weight_history(user.id, request.GET)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        return JsonResponse(weight_history, safe=False, status=201)
+        response = JsonResponse(weight_history, safe=False, status=201)
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+        return response
     
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -163,28 +188,36 @@ def get_weight_record(request):
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@idempotent
 def record_weight(request):
+    """
+    Record one weight. Optional `measured_at` (when the weight was taken, defaults to now) and 
+    `client_id` (a record with the same client_id is only stored once), as in record_weights. 
+    """
     try:
         user = request.user
-        weight = request.data.get('weight')
-
-        previous_weight_record = WeightRecord.objects.filter(patient=user).order_by('-timestamp').first()
-
-        if previous_weight_record:
-            previous_weight = previous_weight_record.weight
-        else:
-            previous_weight = weight
 
         serializer = WeightRecordSerializer(data=request.data)
         if not serializer.is_valid():
             return Response({'error': serializer.errors}, status=400)
-
-        WeightRecord.objects.create(patient=user, weight=serializer.validated_data['weight'])
-
-        treatment_relationships = TreatmentRelationship.objects.filter(patient=user)
-        providers = [relationship.provider for relationship in treatment_relationships]
-
-        response = check_and_notify_weight_change(user, previous_weight, weight, providers)
+        weight = serializer.validated_data['weight']
+        timestamp = serializer.validated_data.get('timestamp') or timezone.now()
+        client_id = serializer.validated_data.get('client_id')
+
+        # The weight record, the patient's summary row and any alert it triggers are written together. 
+        # Alerts are only queued here; emails and texts are sent by the deliver_alerts worker. 
+        with transaction.atomic():
+            # Locking the summary row also serializes this with other uploads for the patient 
+            summary = get_locked_weight_summary(user)
+            if client_id and WeightRecord.objects.filter(patient=user, client_id=client_id).exists():
+                return JsonResponse({'message': 'Weight already recorded'}, status=200)
+
+            previous_timestamp = summary.latest_timestamp
+            record = WeightRecord.objects.create(patient=user, weight=weight, timestamp=timestamp, client_id=client_id)
+            # Like record_weights, a record older than the latest one doesn't go through the alert rules 
+            if previous_timestamp is None or record.timestamp > previous_timestamp:
+                check_and_notify_weight_change(user, summary, [record])
+            apply_weight_record(summary, record)
 
         return JsonResponse({'message': 'Weight recorded successfully'}, status=201)
     
@@ -193,6 +226,79 @@ def record_weight(request):
 
     
 
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+@idempotent
+def record_weights(request):
+    """
+    Batch version of record_weight for weights measured while the app was offline. Takes a list 
+    (or {"records": [...]}) of {weight, measured_at, client_id}. Records whose client_id was already 
+    uploaded are skipped, so a batch can safely be replayed, and alerts are evaluated once for the 
+    whole batch rather than once per record. 
+    """
+    try:
+        user = request.user
+        data = request.data
+        records = data.get('records') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return JsonResponse({'error': 'A non-empty list of records is required'}, status=400)
+        if len(records) > MAX_WEIGHT_BATCH_SIZE:
+            return JsonResponse({'error': f'At most {MAX_WEIGHT_BATCH_SIZE} records can be uploaded at once'}, status=400)
+
+        serializer = WeightRecordSerializer(data=records, many=True)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=400)
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Locking the summary row also serializes concurrent uploads for this patient 
+            summary = get_locked_weight_summary(user)
+            previous_timestamp = summary.latest_timestamp
+
+            client_ids = [item['client_id'] for item in serializer.validated_data if item.get('client_id')]
+            seen_client_ids = set(WeightRecord.objects.filter(
+                patient=user, client_id__in=client_ids
+            ).values_list('client_id', flat=True))
+
+            new_records = []
+            for item in serializer.validated_data:
+                client_id = item.get('client_id')
+                if client_id:
+                    if client_id in seen_client_ids:
+                        continue
+                    seen_client_ids.add(client_id)
+                new_records.append(WeightRecord(
+                    patient=user,
+                    weight=item['weight'],
+                    timestamp=item.get('timestamp') or now,
+                    client_id=client_id
+                ))
+            WeightRecord.objects.bulk_create(new_records)
+
+            if new_records:
+                # Only records newer than the previous latest one go through the alert rules, in order, 
+                # and they produce at most one alert for the whole batch 
+                newer_records = sorted(
+                    (record for record in new_records if previous_timestamp is None or record.timestamp > previous_timestamp),
+                    key=lambda record: record.timestamp
+                )
+                if newer_records:
+                    check_and_notify_weight_change(user, summary, newer_records)
+
+                # Offline records may be older than ones already stored, so rebuild rather than fold them in 
+                rebuild_weight_summary(user)
+
+        return JsonResponse({
+            'message': 'Weights recorded successfully',
+            'created': len(new_records),
+            'skipped': len(serializer.validated_data) - len(new_records)
+        }, status=201)
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 @api_view(['GET'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
@@ -229,5 +335,28 @@ def update_unit_preference(request):
             'message': 'Unit preference updated successfully',
             'unit_preference': user.unit_preference
         }, status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def update_timezone(request):
+    try:
+        time_zone = request.data.get('timezone')
+        if not time_zone or time_zone not in pytz.all_timezones_set:
+            return JsonResponse({'error': 'Invalid timezone, expected an IANA name such as America/Chicago'}, status=400)
+
+        user = request.user
+        with transaction.atomic():
+            user.time_zone = time_zone
+            user.save(update_fields=['time_zone'])
+            reschedule_patient_reminders(user)
+
+        return JsonResponse({
+            'message': 'Timezone updated successfully',
+            'timezone': user.time_zone
+        }, status=200)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
@@ -1,9 +1,10 @@
 
 from datetime import timedelta
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.middleware.csrf import get_token
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import OuterRef, Subquery
+from django.views.decorators.http import condition
+from django.db.models import F
 from django.utils import timezone
 from api.models import *
 from api.forms import *
@@ -13,6 +14,12 @@ from rest_framework.decorators import api_view, authentication_classes, permissi
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import SessionAuthentication
 from api.views.shared_views import send_verification_email
+from api.utils.weight_history import get_weight_history
+from api.utils.weight_summary import dashboard_patients
+from api.utils.export_utils import iter_panel_rows, ndjson_lines, csv_lines
+from api.utils.cache_utils import get_version, get_cached_dashboard
+from api.utils.conditional import dashboard_etag, patient_data_etag, profile_etag, notifications_etag
+from api.utils.notification_utils import get_notification_page, get_unread_count, mark_notifications_read
 
 """
 Note: All provider-facing APIs should use Django's built-in (session-based) authentication 
@@ -66,6 +73,7 @@ def register_provider(request):
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=profile_etag)
 def profile_data(request):
     user = request.user
     notification_pref = getattr(user, 'notification_preference', None)
@@ -88,55 +96,15 @@ def profile_data(request):
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=dashboard_etag)
 def dashboard(request): 
 
-    # Get all patients associated with this provider 
+    # An unchanged dashboard was already answered with 304 by its ETag (see api/signals.py). Other 
+    # requests for the same version are served from the dashboard cache 
     provider = request.user 
-    patient_ids = TreatmentRelationship.objects.filter(
-        provider_id=provider.id 
-    ).values_list('patient_id', flat=True)
-
-    # Subquery to get the latest weight and timestamp
-    latest_weight_subquery = WeightRecord.objects.filter(
-        patient_id=OuterRef('id')
-    ).order_by('-timestamp')
-
-    # Subquery to get alarm_threshold from related PatientInfo
-    alarm_threshold_subquery = PatientInfo.objects.filter(
-        patient_id=OuterRef('id')
-    ).values('alarm_threshold')[:1]
-
-    patients_qs = User.objects.filter(id__in=patient_ids, role='patient').annotate(
-        latest_weight=Subquery(latest_weight_subquery.values_list('weight', flat=True)[:1]),
-        latest_weight_timestamp=Subquery(latest_weight_subquery.values_list('timestamp', flat=True)[:1]),
-        alarm_threshold=Subquery(alarm_threshold_subquery)
-    ).values(
-        'id', 'first_name', 'last_name', 'email',
-        'latest_weight', 'latest_weight_timestamp',
-        'alarm_threshold'
-    )
-    patients = list(patients_qs)
-
-    # Get prev weight/timestamp that is at least one day before the latest 
-    for patient in patients:
-        patient_id = patient['id']
-        latest_timestamp = patient['latest_weight_timestamp']
-
-        if latest_timestamp:
-            prev_record = (
-                WeightRecord.objects.filter(
-                    patient_id=patient_id,
-                    timestamp__date__lt=latest_timestamp.date()
-                )
-                .order_by('-timestamp')
-                .values('weight', 'timestamp')
-                .first()
-            )
-        else:
-            prev_record = None
+    version = getattr(request, 'dashboard_version', None) or get_version('dashboard', provider.id)
 
-        patient['prev_weight'] = prev_record['weight'] if prev_record else None
-        patient['prev_weight_timestamp'] = prev_record['timestamp'] if prev_record else None
+    patients = get_cached_dashboard(provider.id, version, lambda: list(dashboard_patients(provider.id)))
 
     return JsonResponse({'patients': patients})
 
@@ -144,21 +112,22 @@ def dashboard(request):
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=patient_data_etag)
 def get_patient_data(request):
     patient_id = request.GET.get("id")
 
-    # Get weight records 
-    weight_history = list(WeightRecord.objects.filter(
-        patient_id=patient_id
-    ).order_by('timestamp').values('weight', 'timestamp'))
+    # Get weight records, paginated or downsampled (see get_weight_history for the parameters) 
+    try:
+        weight_history, weight_history_next_cursor = get_weight_history(patient_id, request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
     # Get account info and last weight record for convenience 
-    patient = User.objects.filter(id=patient_id, role='patient').annotate(
-        latest_weight=Subquery(WeightRecord.objects.filter(patient_id=patient_id).order_by('-timestamp')
-                .values('weight')[:1]),
-        latest_weight_timestamp=Subquery(WeightRecord.objects.filter(patient_id=patient_id).order_by('-timestamp')
-                .values('timestamp')[:1])
-    ).values('id', 'first_name', 'last_name', 'email', 'latest_weight', 'latest_weight_timestamp')
+    patient = User.objects.filter(id=patient_id, role='patient').values(
+        'id', 'first_name', 'last_name', 'email',
+        latest_weight=F('weight_summary__latest_weight'),
+        latest_weight_timestamp=F('weight_summary__latest_timestamp')
+    )
     if not patient.exists(): 
         return JsonResponse({"error": "Patient not found"}, status=404)
 
@@ -187,6 +156,7 @@ def get_patient_data(request):
     # Construct and send response 
     response_data = dict(patient[0])
     response_data["weight_history"] = weight_history
+    response_data["weight_history_next_cursor"] = weight_history_next_cursor
     response_data["notes"] = patient_notes 
     response_data["patient_info"] = patient_info
     return JsonResponse(response_data, safe=False)
@@ -277,31 +247,88 @@ def add_patient_info(request):
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication])
 @permission_classes([IsAuthenticated])
+def export_patient_panel(request):
+    """
+    Streams every patient, weight record and note of the provider's panel as NDJSON (default) or 
+    CSV (`?export_format=csv`). Rows are read and written in fixed-size chunks, so memory use does 
+    not depend on the size of the panel. 
+    """
+    user = request.user
+    if user.role != User.PROVIDER:
+        return JsonResponse({'error': 'Only providers can access this'}, status=403)
+
+    export_format = request.GET.get('export_format', 'ndjson')
+    if export_format == 'csv':
+        response = StreamingHttpResponse(csv_lines(iter_panel_rows(user)), content_type='text/csv')
+    elif export_format == 'ndjson':
+        response = StreamingHttpResponse(ndjson_lines(iter_panel_rows(user)), content_type='application/x-ndjson')
+    else:
+        return JsonResponse({'error': 'Invalid export format'}, status=400)
+
+    response['Content-Disposition'] = f'attachment; filename="patient_panel.{export_format}"'
+    return response
+
+
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication])
+@permission_classes([IsAuthenticated])
+@condition(etag_func=notifications_etag)
 def get_provider_notifications(request):
     user = request.user
     if user.role != User.PROVIDER:
         return JsonResponse({'error': 'Only providers can access this'}, status=403)
 
-    notifications = ProviderNotification.objects.filter(provider=user).order_by('-created_at')
+    try:
+        notifications, next_cursor = get_notification_page(user, request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
     data = [
         {
-            'message': n.message,
-            'created_at': n.created_at.isoformat(),
-            'is_read': n.is_read,
-            'id': n.id
+            'message': n['message'],
+            'created_at': n['created_at'].isoformat(),
+            'is_read': n['is_read'],
+            'id': n['id'],
+            'patient_id': n['patient_id']
         }
         for n in notifications
     ]
-    return JsonResponse({'notifications': data}, status=200)
+    return JsonResponse({'notifications': data, 'next_cursor': next_cursor}, status=200)
+
+
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication])
+@permission_classes([IsAuthenticated])
+@condition(etag_func=notifications_etag)
+def get_unread_notification_count(request):
+    user = request.user
+    if user.role != User.PROVIDER:
+        return JsonResponse({'error': 'Only providers can access this'}, status=403)
+    return JsonResponse({'unread_count': get_unread_count(user)}, status=200)
+
 
 @api_view(['POST'])
 @authentication_classes([SessionAuthentication])
 @permission_classes([IsAuthenticated])
 def mark_notification_as_read(request, id):
-    try:
-        notification = ProviderNotification.objects.get(id=id)
-        notification.is_read = True
-        notification.save()
-        return JsonResponse({'message': 'Marked as read'}, status=200)
-    except ProviderNotification.DoesNotExist:
+    if not ProviderNotification.objects.filter(id=id, provider=request.user).exists():
         return JsonResponse({'error': 'Notification not found'}, status=404)
+    mark_notifications_read(request.user, [id])
+    return JsonResponse({'message': 'Marked as read'}, status=200)
+
+
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def mark_notifications_as_read(request):
+    """
+    Body: {"ids": [1, 2, ...]} to mark those notifications as read, or {"all": true} for all of them.
+    """
+    ids = request.data.get('ids')
+    if request.data.get('all') is True:
+        ids = None
+    elif not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+        return JsonResponse({'error': 'Expected "ids" as a list of notification ids, or "all": true'}, status=400)
+
+    updated = mark_notifications_read(request.user, ids)
+    return JsonResponse({'message': 'Marked as read', 'updated': updated}, status=200)
@@ -3,7 +3,7 @@ from django.contrib.auth import authenticate, logout, login as django_login
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.crypto import get_random_string
-from django.core.mail import send_mail
+from api.utils.email_utils import html_email, send_emails
 from api.models import *
 from api.forms import *
 from api.serializers import *
@@ -16,7 +16,6 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from django_ratelimit.decorators import ratelimit
 from django.conf import settings
-from twilio.rest import Client
 
 @csrf_exempt
 def test(request: HttpRequest): 
@@ -220,20 +219,7 @@ def send_verification_email(user):
     </html>
     """
 
-    from_email = settings.EMAIL_HOST_USER
-    recipient_list = [user.email]
-
-    try:
-        send_mail(
-            subject,
-            '',
-            from_email,
-            recipient_list,
-            html_message=html_message,
-            fail_silently=False,
-        )
-    except Exception as e:
-        raise e
+    send_emails([html_email(subject, html_message, [user.email])])
     
 @api_view(['GET'])
 def verify_email(request):
@@ -247,91 +233,6 @@ def verify_email(request):
     return JsonResponse({'message': 'Email verified successfully'})
 
 
-def check_and_notify_weight_change(patient, previous_weight, new_weight, providers):
-    # Convert both weights to float to ensure consistent type comparison
-    previous_weight_float = float(previous_weight)
-    new_weight_float = float(new_weight)
-    
-    weight_change = new_weight_float - previous_weight_float
-    if abs(weight_change) > 5:  # Example threshold: 5lbs or more
-        weight_change_data = {
-            "previous_weight": previous_weight_float,
-            "new_weight": new_weight_float,
-            "change": weight_change
-        }
-
-        send_weight_change_notification(patient, weight_change_data, providers)
-
-def send_weight_change_notification(patient, weight_change, providers): # need to call this function when the drastic weight changes is detected
-    subject = f"Alert: Drastic Weight Change Detected"
-
-    message_content = f"""
-    <html>
-      <body style="font-family: Arial, sans-serif; background-color: #f9f9f9; margin: 0; padding: 20px;">
-        <table width="100%" cellpadding="0" cellspacing="0" style="max-width: 600px; margin: 0 auto; background-color: #ffffff; border: 1px solid #ddd; border-radius: 8px; padding: 20px;">
-          <tr>
-            <td style="text-align: center; padding-bottom: 20px;">
-              <h1 style="color: #333; font-size: 24px;">Weight Change Alert</h1>
-              <p style="color: #555; font-size: 16px;">One of your patients has experienced a significant weight change.</p>
-              <p style="color: #555; font-size: 16px;">Change: {weight_change['change']} lbs</p>
-            </td>
-          </tr>
-          <tr>
-            <td style="text-align: center; padding-top: 20px; font-size: 14px; color: #999;">
-              Please review the patient's data and take appropriate action if needed.
-            </td>
-          </tr>
-        </table>
-      </body>
-    </html>
-    """
-
-    message = f"Patient {patient.first_name} {patient.last_name} has experienced a dramatic weight change of {weight_change['change']} lbs. Please review the patient's data and take appropriate action if needed."
-
-    provider_emails = [
-    provider.email for provider in providers
-        if provider.notification_preference and provider.notification_preference.email_notifications
-    ]
-
-    for provider in providers:
-        ProviderNotification.objects.create(
-            provider=provider,
-            message=message
-        )
-
-    from_email = settings.EMAIL_HOST_USER
-    try:
-        send_mail(
-            subject,
-            '',
-            from_email,
-            provider_emails,
-            html_message=message_content,
-            fail_silently=False,
-        )
-    except Exception as e:
-        raise e
-
-    provider_phones = [provider.phone for provider in providers if provider.phone and provider.notification_preference and provider.notification_preference.text_notifications]
-    providers_with_text_enabled = User.objects.filter(
-        role=User.PROVIDER,
-        notification_preference__text_notifications=True
-    )
-    provider_emails = list(providers_with_text_enabled.values_list('phone', flat=True))
-    try:
-        client = Client(settings.TWILIO_SID, settings.TWILIO_TOKEN)
-        for phone in provider_phones:
-            try:
-                message = client.messages.create(
-                    body=message,
-                    from_=settings.TWILIO_PHONE,
-                    to=phone
-                )
-            except Exception as e:
-                continue #pseudo-fail silently, otherwise a failed twilio thing may break an otherwise valid weight record?
-    except Exception as e:
-        raise e
-    
 @api_view(['POST'])
 @authentication_classes([SessionAuthentication])
 @permission_classes([IsAuthenticated])
@@ -41,15 +41,21 @@ ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS").split(",")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587 
-EMAIL_USE_TLS = True
+EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com") # can point at a local SMTP server for testing 
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True") == "True"
 EMAIL_HOST_USER = os.getenv("PROD_EMAIL_HOST_USER", "") # dryweightwatchers email (add it to .env)
 EMAIL_HOST_PASSWORD = os.getenv("PROD_EMAIL_HOST_PASSWORD", "") # the app password (not gmail one, but generated one, also in .env)
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "20")) # seconds, a hung SMTP server must not outlive the alert worker's lease (ALERT_LEASE, 5 min) 
+EMAIL_RATE_PER_SECOND = float(os.getenv("EMAIL_RATE_PER_SECOND", "10")) # reminder emails are throttled to this, keep it under the SMTP provider's limit 
 
 TWILIO_SID = os.environ.get('TWILIO_SID')
 TWILIO_TOKEN = os.environ.get('TWILIO_TOKEN')
 TWILIO_PHONE = os.environ.get('TWILIO_PHONE')
+TWILIO_API_URL = os.environ.get('TWILIO_API_URL') # optional, e.g. http://localhost:8030 for the fake_twilio command 
+TWILIO_TIMEOUT = float(os.environ.get('TWILIO_TIMEOUT', '10')) # seconds per Twilio API request, well under ALERT_LEASE too 
+SMS_RATE_PER_SECOND = float(os.environ.get('SMS_RATE_PER_SECOND', '10'))
+ALERT_COALESCE_WINDOW = int(os.environ.get('ALERT_COALESCE_WINDOW', 15 * 60)) # seconds; weight alerts for a patient are sent at most once per window, 0 to send every alert 
 
 INSTALLED_APPS = [
     "django.contrib.admin",
@@ -150,6 +156,34 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Backed by the database so that every server process sees the same entries (and invalidations). 
+# It only holds small things, like the version counters behind the ETags, not whole responses: 
+# a response cached in the database would cost more reads than the query it replaces. 
+# The table is created with `python manage.py createcachetable`. 
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "dww_cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": 100000,
+        },
+    },
+    # Rendered dashboards, in each process's memory so a hit costs no database round trip. Entries 
+    # are keyed on the shared version counter in "default", so an invalidation reaches every process 
+    "dashboard": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "dww-dashboard",
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -207,6 +241,7 @@ if DJANGO_ENV == "production":
         "Authorization",
         "Content-Type",
         "X-CSRFToken",
+        "Idempotency-Key",
         "Access-Control-Allow-Origin"
     ]
 
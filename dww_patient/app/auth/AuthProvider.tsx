@@ -1,6 +1,8 @@
 import React, { createContext, useContext, useState, ReactNode, useEffect } from "react";
 import * as SecureStore from "expo-secure-store";
 import { isTokenExpired } from "../../utils/jwt"; 
+import { clearWeightRecordCache } from "../../utils/weightHistory";
+import { clearSyncedTimeZone, syncTimeZone } from "../../utils/timeZone";
 
 
 interface AuthContextType {
@@ -53,7 +55,16 @@ export const AuthProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
     loadTokens();
 }, []);
 
+  // Reminders are scheduled in the patient's zone, send the device's whenever a session starts 
+  useEffect(() => {
+    if (accessToken) {
+      syncTimeZone(accessToken, refreshAccessToken, logout);
+    }
+  }, [accessToken]);
+
   const login = async (newAccessToken: string, newRefreshToken: string) => {
+    clearWeightRecordCache();
+    await clearSyncedTimeZone();
     await SecureStore.setItemAsync("accessToken", newAccessToken);
     await SecureStore.setItemAsync("refreshToken", newRefreshToken);
     setAccessToken(newAccessToken);
@@ -61,6 +72,8 @@ export const AuthProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
   };
 
   const logout = async () => {
+    clearWeightRecordCache();
+    await clearSyncedTimeZone();
     await SecureStore.deleteItemAsync("accessToken");
     await SecureStore.deleteItemAsync("refreshToken");
     setAccessToken(null);
@@ -24,6 +24,7 @@ const SignupScreen = () => {
       password1: password,
       password2: confirmPassword,
       role: "patient",
+      time_zone: Intl.DateTimeFormat().resolvedOptions().timeZone,  // reminders fire at local times
     };
 
     try {
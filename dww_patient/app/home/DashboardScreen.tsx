@@ -6,6 +6,7 @@ import Chart from '../../assets/components/Chart';
 import Calendar from '../../assets/components/Calendar';
 import { useAuth } from '../auth/AuthProvider';
 import { authFetch } from '../../utils/authFetch';
+import { fetchAllWeightRecords } from '../../utils/weightHistory';
 
 type WeightRecord = {
   timestamp: Date,
@@ -46,21 +47,7 @@ const DashboardScreen = () => {
 
   const fetchWeightRecord = async () => {
     try {
-      const response = await authFetch(
-        `${process.env.EXPO_PUBLIC_DEV_SERVER_URL}/get-weight-record/`, 
-        accessToken, refreshAccessToken, logout, {
-          method: 'GET', 
-          headers: {
-            'Content-Type': 'application/json', 
-          }, 
-        }
-      );
-
-      if (!response.ok) {
-        throw new Error('Failed to fetch your weight data.');
-      }
-
-      const data = await response.json();
+      const data = await fetchAllWeightRecords(accessToken, refreshAccessToken, logout);
       const formattedRecord = data.map((item: any) => ({
         timestamp: new Date(item.timestamp),
         weight: item.weight,
@@ -3,6 +3,7 @@ import { Text, TouchableOpacity, View, StyleSheet, ScrollView, ActivityIndicator
 import { useNavigation, useFocusEffect } from '@react-navigation/native';
 import type { HomeTabScreenProps, SettingsStackScreenProps } from '../types/navigation';
 import { authFetch } from '@/utils/authFetch';
+import { fetchAllWeightRecords } from '@/utils/weightHistory';
 import { useAuth } from '../auth/AuthProvider';
 import Chart from '../../assets/components/Chart';
 import Calendar from '../../assets/components/Calendar';
@@ -55,21 +56,7 @@ const HomeScreen = () => {
 
   const fetchWeightRecords = async () => {
     try {
-      const response = await authFetch(
-        `${process.env.EXPO_PUBLIC_DEV_SERVER_URL}/get-weight-record/`,
-        accessToken, refreshAccessToken, logout, {
-          method: 'GET',
-          headers: {
-            'Content-Type': 'application/json',
-          },
-        }
-      );
-
-      if (!response.ok) {
-        throw new Error('Failed to fetch your weight data.');
-      }
-
-      const data = await response.json();
+      const data = await fetchAllWeightRecords(accessToken, refreshAccessToken, logout);
       const formattedRecord = data.map((item: any) => ({
         timestamp: new Date(item.timestamp),
         weight: item.weight,
@@ -0,0 +1,44 @@
+/*
+Keeps the patient's time zone on the server in step with the device's, so reminders fire at the
+local time the patient chose, including after travelling or a move. The zone last sent is kept in
+SecureStore so the update is only sent when it actually changes.
+*/
+
+import * as SecureStore from "expo-secure-store";
+import { authFetch } from "./authFetch";
+
+const SYNCED_TIME_ZONE_KEY = "syncedTimeZone";
+
+export const deviceTimeZone = () => Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+export const clearSyncedTimeZone = async () => {
+    await SecureStore.deleteItemAsync(SYNCED_TIME_ZONE_KEY);
+};
+
+export const syncTimeZone = async (
+    accessToken: string | null,
+    refreshAccessToken: () => Promise<void>,
+    logout: () => Promise<void>,
+) => {
+    const timeZone = deviceTimeZone();
+    if (!timeZone || timeZone === await SecureStore.getItemAsync(SYNCED_TIME_ZONE_KEY)) return;
+
+    try {
+        const response = await authFetch(
+            `${process.env.EXPO_PUBLIC_DEV_SERVER_URL}/update-timezone/`,
+            accessToken, refreshAccessToken, logout,
+            {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ timezone: timeZone }),
+            },
+        );
+        if (response.ok) {
+            await SecureStore.setItemAsync(SYNCED_TIME_ZONE_KEY, timeZone);
+        } else {
+            console.error("Failed to update time zone:", await response.text());
+        }
+    } catch (error) {
+        console.error("Error updating time zone:", error);  // tried again next time the app starts
+    }
+};
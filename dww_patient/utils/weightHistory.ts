@@ -0,0 +1,79 @@
+/*
+Keeps the patient's weight history in sync with `get-weight-record`. The whole history is only
+downloaded once (a page at a time, following the X-Next-Cursor header). After that, each fetch
+asks for just the records newer than the last one we have (`since_id`), and sends the ETag of the
+previous answer in If-None-Match, so when nothing has changed the server replies 304 with no body.
+The cache is shared by every screen and cleared on login/logout.
+*/
+
+import { authFetch } from "./authFetch";
+
+
+type WeightHistoryCache = {
+    records: any[];
+    lastId: number | null;  // highest record id we have, records are only ever added
+    etag: string | null;  // of the last answer for `since_id=lastId`
+};
+
+let cache: WeightHistoryCache = { records: [], lastId: null, etag: null };
+
+export const clearWeightRecordCache = () => {
+    cache = { records: [], lastId: null, etag: null };
+};
+
+
+export const fetchAllWeightRecords = async (
+    accessToken: string | null,
+    refreshAccessToken: () => Promise<void>,
+    logout: () => Promise<void>,
+) => {
+    const newRecords: any[] = [];
+    const sinceId = cache.lastId;
+    let etag: string | null = null;
+    let cursor: string | null = null;
+
+    do {
+        const params = new URLSearchParams();
+        if (sinceId !== null) params.append('since_id', String(sinceId));
+        if (cursor) params.append('cursor', cursor);
+        const query = params.toString();
+        const url = `${process.env.EXPO_PUBLIC_DEV_SERVER_URL}/get-weight-record/` + (query ? `?${query}` : '');
+
+        const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+        if (!cursor && cache.etag) {
+            headers['If-None-Match'] = cache.etag;
+        }
+        const response = await authFetch(url, accessToken, refreshAccessToken, logout, {
+            method: 'GET',
+            headers,
+        });
+
+        if (response.status === 304) {
+            return cache.records;
+        }
+        if (!response.ok) {
+            throw new Error('Failed to fetch your weight data.');
+        }
+
+        if (!cursor) {
+            etag = response.headers.get('ETag');
+        }
+        newRecords.push(...await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+
+    if (newRecords.length === 0) {
+        cache.etag = etag;
+        return cache.records;
+    }
+
+    // Offline uploads can be older than records we already have, so keep the list in time order
+    const records = cache.records.concat(newRecords);
+    records.sort((a, b) => new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime() || a.id - b.id);
+    cache = {
+        records,
+        lastId: Math.max(...newRecords.map(record => record.id), sinceId ?? 0),
+        etag: null,  // that ETag was for the old since_id
+    };
+    return cache.records;
+};
@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react';
 import { useNavigate, useParams } from 'react-router-dom';
 import { useAuth } from '../components/AuthContext';
-import { PatientNote, Patient } from '../utils/types';
+import { PatientNote, Patient, WeightRecord } from '../utils/types';
 
 import styles from "../styles/PatientDetails.module.css";
 
@@ -11,6 +11,30 @@ import ChartCalendarViz from '../components/ChartCalendarViz';
 import JSZip from "jszip";
 import { saveAs } from "file-saver";
 
+// The chart only needs one point per day, bucketed on the provider's own calendar
+const timeZone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+const fetchPatientData = async (id: string | undefined, params: Record<string, string>) => {
+  const query = new URLSearchParams({ id: id ?? '', ...params });
+  const res = await fetch(`${process.env.VITE_PUBLIC_DEV_SERVER_URL}/get-patient-data/?${query}`, {
+    headers: { "Content-Type": "application/json" },
+    credentials: "include",
+  });
+  if (!res.ok) { throw new Error(`HTTP error: ${res.status}`); }
+  return res.json();
+};
+
+// Raw records, following the cursor through every page
+const fetchRawWeightHistory = async (id: string | undefined, params: Record<string, string> = {}) => {
+  let data = await fetchPatientData(id, params);
+  let records = data.weight_history;
+  while (data.weight_history_next_cursor) {
+    data = await fetchPatientData(id, { ...params, cursor: data.weight_history_next_cursor });
+    records = records.concat(data.weight_history);
+  }
+  return records.map((record: any) => ({ ...record, timestamp: new Date(record.timestamp) }));
+};
+
 const PatientDetails: React.FC = () => {
 
   const navigate = useNavigate();
@@ -24,6 +48,7 @@ const PatientDetails: React.FC = () => {
 
   const [patient, setPatient] = useState<Patient | null>(null);
   const [selectedDay, setSelectedDay] = useState(new Date());
+  const [dayWeightHistory, setDayWeightHistory] = useState<WeightRecord[]>([]);
   const [editingNoteId, setEditingNoteId] = useState<string | null>(null);
   const [newNoteText, setNewNoteText] = useState<string>('');
 
@@ -133,22 +158,16 @@ const PatientDetails: React.FC = () => {
   useEffect(() => {
     const getPatientData = async () => {
       try {
-        const res = await fetch(`${process.env.VITE_PUBLIC_DEV_SERVER_URL}/get-patient-data/?id=${id}`, {
-          headers: { "Content-Type": "application/json" },
-          credentials: "include",
-        });
-
-        if (!res.ok) { throw new Error(`HTTP error: ${res.status}`); }
-        const data = await res.json();
+        const data = await fetchPatientData(id, { resolution: 'daily', tz: timeZone });
 
         // Convert timestamps to Date objects
         data.notes = data.notes.map((note: PatientNote) => ({
           ...note,
           timestamp: new Date(note.timestamp),
         }));
-        data.weight_history = data.weight_history.map((record: any) => ({
-          ...record,
-          timestamp: new Date(record.timestamp),
+        data.weight_history = data.weight_history.map((bucket: any) => ({
+          timestamp: new Date(bucket.timestamp),
+          weight: bucket.avg_weight,
         }));
         data.patient_info.last_updated = new Date(data.patient_info.last_updated);
 
@@ -162,6 +181,21 @@ const PatientDetails: React.FC = () => {
     getPatientData();
   }, [id, refresh]);
 
+  // The notes section lists every record of the selected day, fetch just that day
+  useEffect(() => {
+    const getDayWeightHistory = async () => {
+      const since = new Date(selectedDay.getFullYear(), selectedDay.getMonth(), selectedDay.getDate());
+      const until = new Date(since.getFullYear(), since.getMonth(), since.getDate() + 1);
+      try {
+        setDayWeightHistory(await fetchRawWeightHistory(id, { since: since.toISOString(), until: until.toISOString() }));
+      } catch (err: any) {
+        setError(err.message);
+      }
+    };
+
+    getDayWeightHistory();
+  }, [id, refresh, selectedDay]);
+
   const handleExportCSV = async () => {
     if (!patient) return;
   
@@ -183,7 +217,8 @@ const PatientDetails: React.FC = () => {
     zip.file("notes.csv", notesCSV);
   
     let weightCSV = "Timestamp,Weight\n";
-    patient.weight_history?.forEach((record: any) => {
+    const weightHistory = await fetchRawWeightHistory(id);
+    weightHistory.forEach((record: any) => {
       weightCSV += `${new Date(record.timestamp).toISOString()},${record.weight}\n`;
     });
   
@@ -218,7 +253,7 @@ const PatientDetails: React.FC = () => {
       {selectedDay && (
         <PatientNotesSection
           selectedDay={selectedDay}
-          weightHistory={patient?.weight_history}
+          weightHistory={dayWeightHistory}
           notes={patient?.notes}
           newNoteText={newNoteText}
           setNewNoteText={setNewNoteText}